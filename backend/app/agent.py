@@ -1,9 +1,63 @@
-﻿import random
-from typing import List, Dict, Iterable
+﻿import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, List, Dict, Iterable, Tuple
 
 import httpx
 
-from .config import GEMINI_API_KEY, LLM_MODEL, LLM_PROVIDER, OPENAI_API_KEY, PERSONA_DEFAULT
+from .config import (
+    GEMINI_API_KEY,
+    GEMINI_BASE_URL,
+    GEMINI_MODEL,
+    LLM_BREAKER_COOLDOWN,
+    LLM_BREAKER_ERROR_RATE,
+    LLM_BREAKER_MIN_CALLS,
+    LLM_BREAKER_SLOW_MS,
+    LLM_BREAKER_WINDOW,
+    LLM_HEDGE,
+    LLM_HEDGE_DELAY_MS,
+    LLM_HEDGE_MIN_MS,
+    LLM_HISTORY_TURNS,
+    LLM_HTTP2,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_LATENCY_BUDGET_MS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE,
+    LLM_MAX_PROMPT_TOKENS,
+    LLM_MODEL,
+    LLM_PROVIDER,
+    LLM_ROUTER_PROVIDERS,
+    LLM_ROUTER_WINDOW,
+    LLM_TIMEOUT,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MODEL,
+    PERSONA_DEFAULT,
+    REDIS_URL,
+    REPLY_CACHE_DISABLED_PERSONAS,
+    REPLY_CACHE_ENABLED,
+    REPLY_CACHE_REDIS,
+    REPLY_CACHE_SIZE,
+    REPLY_CACHE_TTL,
+)
+from .scam_detector import SCAM_KEYWORDS, find_keywords
+from .metrics import (
+    AGENT_REPLY_SECONDS,
+    LLM_COALESCED,
+    LLM_FALLBACKS,
+    LLM_HEDGED,
+    LLM_PROVIDER_SECONDS,
+    LLM_REJECTED,
+    REPLY_CACHE_LOOKUPS,
+)
+
+SUMMARY_MAX_TOPICS = 12
 
 PERSONA_PROMPTS = {
     "elderly": (
@@ -67,6 +121,78 @@ def get_profile(persona: str | None, existing: Dict[str, str] | None = None) ->
     return PERSONA_PROFILES.get(key, PERSONA_PROFILES["elderly"])
 
 
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for chat text; cheap and errs slightly high
+    return len(text or "") // 4 + 1
+
+
+def _message_tokens(message: Dict[str, str]) -> int:
+    # Chat formats add a few tokens of framing per message
+    return estimate_tokens(message.get("content", "")) + 4
+
+
+@lru_cache(maxsize=256)
+def _persona_block(persona: str, profile: Tuple[Tuple[str, str], ...]) -> Tuple[Tuple[Dict[str, str], ...], int]:
+    # The persona prompt and memory card only change with the persona, so both
+    # messages and their token estimate are built once per persona/profile
+    card = dict(profile)
+    memory_card = (
+        f"Persona Profile: age={card.get('age')}, device={card.get('device')}, "
+        f"tech={card.get('tech')}, experience={card.get('experience')}."
+    )
+    block = (
+        {"role": "system", "content": get_system_prompt(persona)},
+        {"role": "system", "content": memory_card},
+    )
+    return block, sum(_message_tokens(m) for m in block)
+
+
+def update_history_summary(
+    summary: Dict[str, Any],
+    history: List[Dict[str, str]],
+    offset: int,
+    upto: int,
+) -> Dict[str, Any]:
+    # Folds history[:upto] into a rolling summary kept in the session. `offset` is the
+    # number of turns the store already trimmed, so coverage survives trimming and
+    # each turn is only ever read once.
+    covered = int(summary.get("covered") or 0)
+    start = max(covered - offset, 0)
+    if upto <= start:
+        return summary
+    topics: List[str] = list(summary.get("topics") or [])
+    scammer_turns = int(summary.get("scammer_turns") or 0)
+    opening = summary.get("opening") or ""
+    for item in history[start:upto]:
+        if item.get("role") != "user":
+            continue
+        content = item.get("content", "")
+        scammer_turns += 1
+        if not opening:
+            opening = " ".join(content.split())[:160]
+        for keyword in find_keywords(content.lower()):
+            if keyword in SCAM_KEYWORDS and keyword not in topics:
+                topics.append(keyword)
+    summary.update(
+        covered=offset + upto,
+        scammer_turns=scammer_turns,
+        opening=opening,
+        topics=topics[:SUMMARY_MAX_TOPICS],
+    )
+    return summary
+
+
+def _summary_text(summary: Dict[str, Any]) -> str:
+    if not summary.get("covered"):
+        return ""
+    text = f"Earlier conversation (summarized): {summary.get('scammer_turns', 0)} scammer messages"
+    if summary.get("opening"):
+        text += f', opening with "{summary["opening"]}"'
+    if summary.get("topics"):
+        text += f". Topics raised: {', '.join(summary['topics'])}"
+    return text + "."
+
+
 def _history_text(history: List[Dict[str, str]]) -> str:
     return " ".join(item.get("content", "") for item in history).lower()
 
@@ -301,94 +427,811 @@ def _normal_reply(persona: str | None, last_user: str) -> str:
     return f"{rng.choice(options)} {rng.choice(caring)}"
 
 
+_http_client: httpx.Client | None = None
+_async_http_client: httpx.AsyncClient | None = None
+
+
+def _http2_enabled() -> bool:
+    if not LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.Client(timeout=LLM_TIMEOUT, limits=_http_limits(), http2=_http2_enabled())
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        _async_http_client = httpx.AsyncClient(timeout=LLM_TIMEOUT, limits=_http_limits(), http2=_http2_enabled())
+    return _async_http_client
+
+
+async def close_http_clients() -> None:
+    global _http_client, _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+
+
 class BaseLLMClient:
+    name = "base"
+
     def generate(self, messages: List[Dict[str, str]]) -> str:
         raise NotImplementedError
 
+    async def agenerate(self, messages: List[Dict[str, str]]) -> str:
+        # Clients without a native async path still must not block the event loop
+        return await asyncio.to_thread(self.generate, messages)
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        # Providers without a streaming API deliver the whole reply as one chunk
+        yield await self.agenerate(messages)
+
+
+async def _sse_data(resp: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    async for line in resp.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        yield json.loads(data)
+
 
 class MockLLMClient(BaseLLMClient):
+    name = "mock"
+
     def generate(self, messages: List[Dict[str, str]]) -> str:
         history = [m for m in messages if m.get("role") != "system"]
         return _rule_based_reply(history)
 
+    async def agenerate(self, messages: List[Dict[str, str]]) -> str:
+        return self.generate(messages)
+
 
 class OpenAIClient(BaseLLMClient):
-    def __init__(self, api_key: str, model: str) -> None:
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str, base_url: str = "") -> None:
         self.api_key = api_key
         self.model = model or "gpt-4o-mini"
+        self.url = (base_url or "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
 
-    def generate(self, messages: List[Dict[str, str]]) -> str:
-        headers = {"Authorization": f"Bearer {self.api_key}"}
-        body = {
+    def _request(self, messages: List[Dict[str, str]], stream: bool = False) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
             "model": self.model,
             "messages": messages,
             "temperature": 0.7,
         }
-        with httpx.Client(timeout=15) as client:
-            resp = client.post("https://api.openai.com/v1/chat/completions", headers=headers, json=body)
-            resp.raise_for_status()
-            data = resp.json()
+        if stream:
+            body["stream"] = True
+        return {
+            "url": self.url,
+            "headers": {"Authorization": f"Bearer {self.api_key}"},
+            "json": body,
+        }
+
+    def _parse(self, data: Dict[str, Any]) -> str:
         return data["choices"][0]["message"]["content"].strip()
 
+    def generate(self, messages: List[Dict[str, str]]) -> str:
+        resp = get_http_client().post(**self._request(messages))
+        resp.raise_for_status()
+        return self._parse(resp.json())
+
+    async def agenerate(self, messages: List[Dict[str, str]]) -> str:
+        resp = await get_async_http_client().post(**self._request(messages))
+        resp.raise_for_status()
+        return self._parse(resp.json())
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        async with get_async_http_client().stream("POST", **self._request(messages, stream=True)) as resp:
+            resp.raise_for_status()
+            async for data in _sse_data(resp):
+                choices = data.get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+
 
 class GeminiClient(BaseLLMClient):
-    def __init__(self, api_key: str, model: str) -> None:
+    name = "gemini"
+
+    def __init__(self, api_key: str, model: str, base_url: str = "") -> None:
         self.api_key = api_key
         self.model = model or "gemini-1.5-flash"
+        self.base_url = (base_url or "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
 
-    def generate(self, messages: List[Dict[str, str]]) -> str:
+    def _request(self, messages: List[Dict[str, str]], stream: bool = False) -> Dict[str, Any]:
         # Minimal REST call. Adjust endpoint for your Gemini deployment if needed.
-        url = "https://generativelanguage.googleapis.com/v1beta/models/" + self.model + ":generateContent"
+        method = ":streamGenerateContent" if stream else ":generateContent"
+        url = self.base_url + "/models/" + self.model + method
         params = {"key": self.api_key}
+        if stream:
+            params["alt"] = "sse"
         prompt = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
-        body = {"contents": [{"parts": [{"text": prompt}]}]}
-        with httpx.Client(timeout=15) as client:
-            resp = client.post(url, params=params, json=body)
-            resp.raise_for_status()
-            data = resp.json()
+        return {
+            "url": url,
+            "params": params,
+            "json": {"contents": [{"parts": [{"text": prompt}]}]},
+        }
+
+    def _parse(self, data: Dict[str, Any]) -> str:
         return data["candidates"][0]["content"]["parts"][0]["text"].strip()
 
+    def generate(self, messages: List[Dict[str, str]]) -> str:
+        resp = get_http_client().post(**self._request(messages))
+        resp.raise_for_status()
+        return self._parse(resp.json())
+
+    async def agenerate(self, messages: List[Dict[str, str]]) -> str:
+        resp = await get_async_http_client().post(**self._request(messages))
+        resp.raise_for_status()
+        return self._parse(resp.json())
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        async with get_async_http_client().stream("POST", **self._request(messages, stream=True)) as resp:
+            resp.raise_for_status()
+            async for data in _sse_data(resp):
+                candidates = data.get("candidates") or [{}]
+                parts = (candidates[0].get("content") or {}).get("parts") or []
+                text = "".join(part.get("text", "") for part in parts)
+                if text:
+                    yield text
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        window: int = 20,
+        error_rate: float = 0.5,
+        slow_seconds: float = 8.0,
+        min_calls: int = 5,
+        cooldown: float = 30.0,
+    ) -> None:
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        # Rolling outcomes of the last `window` calls; a slow success counts as a failure
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, window))
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "open" or self._probing:
+                return False
+            # Half-open: let a single probe through to test the provider
+            self._probing = True
+            return True
+
+    def abandon(self) -> None:
+        # An admitted call that never reached the provider; frees the probe slot
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok: bool, latency: float) -> None:
+        ok = ok and latency <= self.slow_seconds
+        with self._lock:
+            if self._opened_at is not None:
+                if not self._probing:
+                    # A call admitted before the breaker opened; the probe decides
+                    return
+                self._probing = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._opened_at = time.monotonic()
+
+
+class _BreakerCall:
+    # One provider call's outcome is recorded once: when the call ends, or as a
+    # failure as soon as its waiters give up on the latency budget, so a provider
+    # slower than the budget trips the breaker without waiting for its answer
+    def __init__(self, breaker: CircuitBreaker) -> None:
+        self.breaker = breaker
+        self.start: float | None = None
+        self.recorded = False
+
+    def begin(self) -> None:
+        self.start = time.monotonic()
+
+    def record(self, ok: bool) -> None:
+        # Calls still queued for a concurrency slot never reached the provider
+        if self.recorded or self.start is None:
+            return
+        self.recorded = True
+        self.breaker.record(ok, time.monotonic() - self.start)
+
+
+class GuardedLLMClient(BaseLLMClient):
+    def __init__(
+        self,
+        client: BaseLLMClient,
+        max_concurrency: int = 0,
+        budget: float = 0.0,
+        breaker: CircuitBreaker | None = None,
+    ) -> None:
+        self.client = client
+        self.name = client.name
+        self.budget = budget
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        # Identical prompts in flight share one provider call
+        self._inflight: Dict[str, Tuple[asyncio.Task, _BreakerCall]] = {}
+
+    def _reject(self, reason: str) -> LLMUnavailable:
+        LLM_REJECTED.inc(provider=self.name, reason=reason)
+        return LLMUnavailable(f"{self.name}: {reason}")
+
+    def _remaining(self, deadline: float | None) -> float | None:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    async def _acquire(self, deadline: float | None) -> None:
+        if self._semaphore is None:
+            return
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self._remaining(deadline))
+        except asyncio.TimeoutError:
+            self.breaker.abandon()
+            raise self._reject("saturated") from None
+        except BaseException:
+            self.breaker.abandon()
+            raise
+
+    def _release(self) -> None:
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def generate(self, messages: List[Dict[str, str]]) -> str:
+        if not self.breaker.allow():
+            raise self._reject("circuit_open")
+        start = time.monotonic()
+        try:
+            reply = self.client.generate(messages)
+        except Exception:
+            self.breaker.record(False, time.monotonic() - start)
+            raise
+        self.breaker.record(True, time.monotonic() - start)
+        return reply
+
+    async def _call(self, messages: List[Dict[str, str]], deadline: float | None, call: _BreakerCall) -> str:
+        # Holds its concurrency slot until the provider answers, even if every
+        # waiter has already given up on the budget, so a slow provider cannot
+        # pile up unbounded requests
+        await self._acquire(deadline)
+        call.begin()
+        try:
+            reply = await self.client.agenerate(messages)
+        except Exception:
+            call.record(False)
+            raise
+        finally:
+            self._release()
+        call.record(True)
+        return reply
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def agenerate(self, messages: List[Dict[str, str]]) -> str:
+        deadline = time.monotonic() + self.budget if self.budget > 0 else None
+        key = ReplyCache.make_key(messages)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            LLM_COALESCED.inc(provider=self.name)
+            task, call = inflight
+        else:
+            if not self.breaker.allow():
+                raise self._reject("circuit_open")
+            call = _BreakerCall(self.breaker)
+            task = asyncio.ensure_future(self._call(messages, deadline, call))
+            self._inflight[key] = (task, call)
+            task.add_done_callback(lambda done: self._forget(key, done))
+        try:
+            # Shielded so one waiter timing out does not cancel the call for the others
+            return await asyncio.wait_for(asyncio.shield(task), self._remaining(deadline))
+        except asyncio.TimeoutError:
+            call.record(False)
+            raise self._reject("budget") from None
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        # Streams are not coalesced; the budget bounds the wait for the first token
+        if not self.breaker.allow():
+            raise self._reject("circuit_open")
+        deadline = time.monotonic() + self.budget if self.budget > 0 else None
+        await self._acquire(deadline)
+        start = time.monotonic()
+        stream = self.client.astream(messages).__aiter__()
+        ok = True
+        try:
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), self._remaining(deadline))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise self._reject("budget") from None
+            yield first
+            async for chunk in stream:
+                yield chunk
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self._release()
+            self.breaker.record(ok, time.monotonic() - start)
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+class ProviderStats:
+    def __init__(self, window: int = 100) -> None:
+        # Rolling (latency, ok) samples of the last `window` calls
+        self._samples: Deque[Tuple[float, bool]] = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((latency, ok))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            samples = list(self._samples)
+        return sum(1 for _, ok in samples if not ok) / len(samples) if samples else 0.0
+
+    def quantile(self, q: float) -> float | None:
+        with self._lock:
+            latencies = sorted(latency for latency, ok in self._samples if ok)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+class RouterLLMClient(BaseLLMClient):
+    name = "router"
+
+    def __init__(
+        self,
+        clients: List[BaseLLMClient],
+        hedge: bool = True,
+        hedge_delay: float = 1.5,
+        hedge_min_delay: float = 0.2,
+        window: int = 100,
+        min_samples: int = 10,
+        max_error_rate: float = 0.5,
+    ) -> None:
+        # The mock provider never competes on latency; it only answers when every
+        # real provider has failed
+        self.clients = [c for c in clients if not isinstance(c, MockLLMClient)]
+        self.last_resort = next((c for c in clients if isinstance(c, MockLLMClient)), None)
+        self.stats = {c.name: ProviderStats(window) for c in self.clients}
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+
+    def _healthy(self, client: BaseLLMClient) -> bool:
+        breaker = getattr(client, "breaker", None)
+        if breaker is not None and breaker.state == "open":
+            return False
+        stats = self.stats[client.name]
+        return len(stats) < self.min_samples or stats.error_rate() < self.max_error_rate
+
+    def ranked(self) -> List[BaseLLMClient]:
+        # Healthy providers first, fastest median first. Providers without enough
+        # samples keep their configured order behind measured ones; hedges and
+        # failovers measure them without slowing down live traffic
+        def key(client: BaseLLMClient) -> Tuple[bool, bool, float]:
+            stats = self.stats[client.name]
+            median = stats.quantile(0.5) if len(stats) >= self.min_samples else None
+            return (not self._healthy(client), median is None, median or 0.0)
+
+        return sorted(self.clients, key=key)
+
+    def _hedge_after(self, client: BaseLLMClient) -> float:
+        stats = self.stats[client.name]
+        p90 = stats.quantile(0.9) if len(stats) >= self.min_samples else None
+        return max(self.hedge_min_delay, p90 if p90 is not None else self.hedge_delay)
+
+    def _record(self, client: BaseLLMClient, start: float, ok: bool, outcome: str = "") -> None:
+        latency = time.monotonic() - start
+        self.stats[client.name].record(latency, ok)
+        LLM_PROVIDER_SECONDS.observe(latency, provider=client.name, outcome=outcome or ("ok" if ok else "error"))
+
+    async def _timed(self, client: BaseLLMClient, messages: List[Dict[str, str]]) -> str:
+        start = time.monotonic()
+        try:
+            reply = await client.agenerate(messages)
+        except asyncio.CancelledError:
+            # Lost a hedge race. Not an error, but the time so far is a lower bound
+            # on its latency; without it a provider that always loses would never
+            # collect samples and would keep being ranked first
+            self._record(client, start, True, "cancelled")
+            raise
+        except Exception:
+            self._record(client, start, False)
+            raise
+        self._record(client, start, True)
+        return reply
+
+    def _last_resort(self, messages: List[Dict[str, str]], error: Exception | None) -> str:
+        if self.last_resort is None:
+            raise error or LLMUnavailable("router: no providers")
+        return self.last_resort.generate(messages)
+
+    def generate(self, messages: List[Dict[str, str]]) -> str:
+        error: Exception | None = None
+        for client in self.ranked():
+            start = time.monotonic()
+            try:
+                reply = client.generate(messages)
+            except Exception as exc:
+                self._record(client, start, False)
+                error = exc
+                continue
+            self._record(client, start, True)
+            return reply
+        return self._last_resort(messages, error)
+
+    async def agenerate(self, messages: List[Dict[str, str]]) -> str:
+        order = self.ranked()
+        pending: Dict[asyncio.Task, BaseLLMClient] = {}
+        error: Exception | None = None
+        launched = 0
+
+        def launch() -> None:
+            nonlocal launched
+            client = order[launched]
+            launched += 1
+            pending[asyncio.ensure_future(self._timed(client, messages))] = client
+
+        try:
+            if order:
+                launch()
+            while pending:
+                # While a spare provider is left, wait only as long as the newest
+                # request's p90 before hedging to the next one
+                newest = list(pending.values())[-1]
+                timeout = self._hedge_after(newest) if self.hedge and launched < len(order) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    LLM_HEDGED.inc(provider=order[launched].name)
+                    launch()
+                    continue
+                for task in done:
+                    pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                # Every request so far failed: fail over to the next provider right away
+                if not pending and launched < len(order):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        return self._last_resort(messages, error)
+
+    async def astream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        # Streams are not hedged; a provider that fails before its first token
+        # hands over to the next one
+        error: Exception | None = None
+        for client in self.ranked():
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in client.astream(messages):
+                    started = True
+                    yield chunk
+            except Exception as exc:
+                self._record(client, start, False)
+                if started:
+                    raise
+                error = exc
+                continue
+            self._record(client, start, True)
+            return
+        yield self._last_resort(messages, error)
+
+
+def _guarded(client: BaseLLMClient) -> GuardedLLMClient:
+    breaker = CircuitBreaker(
+        window=LLM_BREAKER_WINDOW,
+        error_rate=LLM_BREAKER_ERROR_RATE,
+        slow_seconds=LLM_BREAKER_SLOW_MS / 1000,
+        min_calls=LLM_BREAKER_MIN_CALLS,
+        cooldown=LLM_BREAKER_COOLDOWN,
+    )
+    return GuardedLLMClient(client, LLM_MAX_CONCURRENCY, LLM_LATENCY_BUDGET_MS / 1000, breaker)
+
+
+def _provider_client(name: str, model: str = "") -> BaseLLMClient | None:
+    if name == "openai" and OPENAI_API_KEY:
+        return _guarded(OpenAIClient(OPENAI_API_KEY, model or OPENAI_MODEL, OPENAI_BASE_URL))
+    if name == "gemini" and GEMINI_API_KEY:
+        return _guarded(GeminiClient(GEMINI_API_KEY, model or GEMINI_MODEL, GEMINI_BASE_URL))
+    if name == "mock":
+        return MockLLMClient()
+    return None
+
 
 def get_llm_client() -> BaseLLMClient:
-    if LLM_PROVIDER == "openai" and OPENAI_API_KEY:
-        return OpenAIClient(OPENAI_API_KEY, LLM_MODEL)
-    if LLM_PROVIDER == "gemini" and GEMINI_API_KEY:
-        return GeminiClient(GEMINI_API_KEY, LLM_MODEL)
-    return MockLLMClient()
+    if LLM_PROVIDER == "router":
+        clients = [c for c in (_provider_client(name) for name in LLM_ROUTER_PROVIDERS) if c is not None]
+        if any(not isinstance(c, MockLLMClient) for c in clients):
+            return RouterLLMClient(
+                clients,
+                hedge=LLM_HEDGE,
+                hedge_delay=LLM_HEDGE_DELAY_MS / 1000,
+                hedge_min_delay=LLM_HEDGE_MIN_MS / 1000,
+                window=LLM_ROUTER_WINDOW,
+            )
+        return MockLLMClient()
+    return _provider_client(LLM_PROVIDER, LLM_MODEL) or MockLLMClient()
+
+
+def _persona_key(persona: str | None) -> str:
+    return (persona or PERSONA_DEFAULT or "elderly").lower()
+
+
+def _last_user(history: List[Dict[str, str]]) -> str:
+    for item in reversed(history):
+        if item.get("role") == "user":
+            return item.get("content", "")
+    return ""
+
+
+class ReplyCache:
+    def __init__(
+        self,
+        max_size: int,
+        ttl: int,
+        redis_url: str = "",
+        disabled_personas: Iterable[str] = (),
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disabled_personas = {p.lower() for p in disabled_personas}
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._aredis = None
+        if redis_url:
+            import redis
+            import redis.asyncio as aioredis
+
+            # The sync client serves reply() (scripts, replay); request handlers use
+            # the asyncio one so a lookup never blocks the event loop
+            self._redis = redis.Redis.from_url(redis_url, decode_responses=True)
+            self._aredis = aioredis.Redis.from_url(redis_url, decode_responses=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        raw = json.dumps(parts, ensure_ascii=True, separators=(",", ":"))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def enabled_for(self, persona: str | None) -> bool:
+        return _persona_key(persona) not in self.disabled_personas
+
+    def _redis_key(self, key: str) -> str:
+        return f"reply:{key}"
+
+    def _put_local(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_local(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    REPLY_CACHE_LOOKUPS.inc(result="hit")
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    def _found(self, key: str, value: str | None) -> str | None:
+        if value is not None:
+            self._put_local(key, value)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        REPLY_CACHE_LOOKUPS.inc(result="miss" if value is None else "hit")
+        return value
+
+    # shared=False keeps a lookup or store in process: replies that are cheaper to
+    # recompute than a Redis round trip never touch the shared tier
+    def get(self, key: str, shared: bool = True) -> str | None:
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        if shared and self._redis is not None:
+            try:
+                value = self._redis.get(self._redis_key(key))
+            except Exception:
+                value = None
+        return self._found(key, value)
+
+    async def aget(self, key: str, shared: bool = True) -> str | None:
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        if shared and self._aredis is not None:
+            try:
+                value = await self._aredis.get(self._redis_key(key))
+            except Exception:
+                value = None
+        return self._found(key, value)
+
+    def set(self, key: str, value: str, shared: bool = True) -> None:
+        self._put_local(key, value)
+        if shared and self._redis is not None:
+            try:
+                self._redis.set(self._redis_key(key), value, ex=self.ttl)
+            except Exception:
+                pass
+
+    async def aset(self, key: str, value: str, shared: bool = True) -> None:
+        self._put_local(key, value)
+        if shared and self._aredis is not None:
+            try:
+                await self._aredis.set(self._redis_key(key), value, ex=self.ttl)
+            except Exception:
+                pass
+
+    async def close(self) -> None:
+        if self._aredis is not None:
+            await self._aredis.aclose()
+        if self._redis is not None:
+            self._redis.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def get_reply_cache() -> ReplyCache | None:
+    if not REPLY_CACHE_ENABLED or REPLY_CACHE_SIZE <= 0:
+        return None
+    redis_url = REDIS_URL if REPLY_CACHE_REDIS else ""
+    try:
+        return ReplyCache(REPLY_CACHE_SIZE, REPLY_CACHE_TTL, redis_url, REPLY_CACHE_DISABLED_PERSONAS)
+    except Exception:
+        return ReplyCache(REPLY_CACHE_SIZE, REPLY_CACHE_TTL, "", REPLY_CACHE_DISABLED_PERSONAS)
 
 
 class HoneyPotAgent:
-    def __init__(self, llm_client: BaseLLMClient) -> None:
+    def __init__(self, llm_client: BaseLLMClient, cache: ReplyCache | None = None) -> None:
         self.llm_client = llm_client
+        self.cache = cache
+        self.provider = getattr(llm_client, "name", type(llm_client).__name__.lower())
+        # Only LLM output is worth a Redis round trip; rule-based replies stay in process
+        self._share_replies = not isinstance(llm_client, MockLLMClient)
 
-    def reply(
+    def _cache_key(
         self,
         history: List[Dict[str, str]],
-        persona: str | None = None,
-        intel: Dict[str, List[str]] | None = None,
-        asked: Iterable[str] | None = None,
-        profile: Dict[str, str] | None = None,
-    ) -> str:
-        intel = intel or {"upi_ids": [], "bank_accounts": [], "phishing_links": []}
-        profile = get_profile(persona, profile)
+        persona: str | None,
+        intel: Dict[str, List[str]],
+        asked: Iterable[str] | None,
+    ) -> str | None:
+        if self.cache is None or not self.cache.enabled_for(persona):
+            return None
+        last_user = _last_user(history)
+        context = _infer_context(last_user)
+        needs = _next_requests(intel, asked or [], context, last_user)
+        # Rule-based and LLM replies are cached apart so a provider outage never
+        # pins the fallback text for everyone
+        kind = "rule" if isinstance(self.llm_client, MockLLMClient) else self.provider
+        normalized = " ".join(last_user.lower().split())
+        return ReplyCache.make_key(kind, _persona_key(persona), context, needs, normalized)
 
-        if isinstance(self.llm_client, MockLLMClient):
-            return _rule_based_reply(history, persona, intel, asked)
+    def _observe(self, start: float, outcome: str) -> None:
+        AGENT_REPLY_SECONDS.observe(time.perf_counter() - start, provider=self.provider, outcome=outcome)
+
+    def _fallback(self, start: float, *args: Any) -> str:
+        LLM_FALLBACKS.inc(provider=self.provider)
+        reply = _rule_based_reply(*args)
+        self._observe(start, "fallback")
+        return reply
+
+    def _cached(self, key: str | None, shared: bool = True) -> str | None:
+        if key is None or self.cache is None:
+            return None
+        return self.cache.get(key, shared and self._share_replies)
+
+    def _remember(self, key: str | None, reply: str, shared: bool = True) -> str:
+        if key is not None and self.cache is not None and reply:
+            self.cache.set(key, reply, shared and self._share_replies)
+        return reply
+
+    async def _acached(self, key: str | None, shared: bool = True) -> str | None:
+        if key is None or self.cache is None:
+            return None
+        return await self.cache.aget(key, shared and self._share_replies)
 
-        last_user = ""
-        for item in reversed(history):
-            if item.get("role") == "user":
-                last_user = item.get("content", "")
-                break
+    async def _aremember(self, key: str | None, reply: str, shared: bool = True) -> str:
+        if key is not None and self.cache is not None and reply:
+            await self.cache.aset(key, reply, shared and self._share_replies)
+        return reply
 
+    def _build_messages(
+        self,
+        history: List[Dict[str, str]],
+        persona: str | None,
+        intel: Dict[str, List[str]],
+        asked: Iterable[str] | None,
+        profile: Dict[str, str],
+        summary: Dict[str, Any] | None = None,
+        offset: int = 0,
+    ) -> List[Dict[str, str]]:
+        last_user = _last_user(history)
         context = _infer_context(last_user)
         needs = _next_requests(intel, asked or [], context, last_user)
         needs_text = ", ".join(needs) if needs else "confirm steps"
 
-        memory_card = (
-            f"Persona Profile: age={profile.get('age')}, device={profile.get('device')}, "
-            f"tech={profile.get('tech')}, experience={profile.get('experience')}."
-        )
         intel_summary = (
             f"Known Intel: upi={len(intel.get('upi_ids', []))}, "
             f"bank={len(intel.get('bank_accounts', []))}, "
@@ -396,18 +1239,152 @@ class HoneyPotAgent:
         )
         strategy = f"Next requests: {needs_text}. Ask naturally and keep persona."
 
-        system = get_system_prompt(persona)
-        messages = [
-            {"role": "system", "content": system},
-            {"role": "system", "content": memory_card},
+        block, block_tokens = _persona_block(_persona_key(persona), tuple(sorted(profile.items())))
+        system = list(block) + [
             {"role": "system", "content": intel_summary},
             {"role": "system", "content": strategy},
-        ] + history
+        ]
+        budget = LLM_MAX_PROMPT_TOKENS - block_tokens - sum(_message_tokens(m) for m in system[2:])
+
+        # Only the latest turns go out verbatim; older ones are folded into the summary
+        window = history[-LLM_HISTORY_TURNS:] if LLM_HISTORY_TURNS > 0 else list(history)
+        if summary is None:
+            summary = {}
+        update_history_summary(summary, history, offset, len(history) - len(window))
+        summary_tokens = _message_tokens({"content": _summary_text(summary)})
+        sizes = [_message_tokens(m) for m in window]
+        while len(window) > 1 and sum(sizes) + summary_tokens > budget:
+            window = window[1:]
+            sizes = sizes[1:]
+        update_history_summary(summary, history, offset, len(history) - len(window))
+
+        text = _summary_text(summary)
+        if text:
+            system.append({"role": "system", "content": text})
+        if window and sum(sizes) + summary_tokens > budget:
+            # A single oversized message is cut rather than dropped
+            keep = max(budget - summary_tokens - 5, 1) * 4
+            window = [{**window[0], "content": window[0].get("content", "")[:keep]}]
+        return system + window
+
+    def reply(
+        self,
+        history: List[Dict[str, str]],
+        persona: str | None = None,
+        intel: Dict[str, List[str]] | None = None,
+        asked: Iterable[str] | None = None,
+        profile: Dict[str, str] | None = None,
+        summary: Dict[str, Any] | None = None,
+        offset: int = 0,
+    ) -> str:
+        intel = intel or {"upi_ids": [], "bank_accounts": [], "phishing_links": []}
+        profile = get_profile(persona, profile)
+
+        start = time.perf_counter()
+        key = self._cache_key(history, persona, intel, asked)
+        cached = self._cached(key)
+        if cached is not None:
+            self._observe(start, "cache")
+            return cached
+
+        if isinstance(self.llm_client, MockLLMClient):
+            reply = self._remember(key, _rule_based_reply(history, persona, intel, asked))
+            self._observe(start, "rule")
+            return reply
+
+        messages = self._build_messages(history, persona, intel, asked, profile, summary, offset)
+        try:
+            reply = self._remember(key, self.llm_client.generate(messages))
+        except Exception:
+            return self._fallback(start, history, persona, intel, asked)
+        self._observe(start, "llm")
+        return reply
+
+    async def areply(
+        self,
+        history: List[Dict[str, str]],
+        persona: str | None = None,
+        intel: Dict[str, List[str]] | None = None,
+        asked: Iterable[str] | None = None,
+        profile: Dict[str, str] | None = None,
+        summary: Dict[str, Any] | None = None,
+        offset: int = 0,
+    ) -> str:
+        intel = intel or {"upi_ids": [], "bank_accounts": [], "phishing_links": []}
+        profile = get_profile(persona, profile)
+
+        start = time.perf_counter()
+        key = self._cache_key(history, persona, intel, asked)
+        cached = await self._acached(key)
+        if cached is not None:
+            self._observe(start, "cache")
+            return cached
+
+        if isinstance(self.llm_client, MockLLMClient):
+            reply = await self._aremember(key, _rule_based_reply(history, persona, intel, asked))
+            self._observe(start, "rule")
+            return reply
+
+        messages = self._build_messages(history, persona, intel, asked, profile, summary, offset)
+        try:
+            reply = await self._aremember(key, await self.llm_client.agenerate(messages))
+        except Exception:
+            return self._fallback(start, history, persona, intel, asked)
+        self._observe(start, "llm")
+        return reply
 
+    async def astream_reply(
+        self,
+        history: List[Dict[str, str]],
+        persona: str | None = None,
+        intel: Dict[str, List[str]] | None = None,
+        asked: Iterable[str] | None = None,
+        profile: Dict[str, str] | None = None,
+        summary: Dict[str, Any] | None = None,
+        offset: int = 0,
+    ) -> AsyncIterator[str]:
+        intel = intel or {"upi_ids": [], "bank_accounts": [], "phishing_links": []}
+        profile = get_profile(persona, profile)
+
+        start = time.perf_counter()
+        key = self._cache_key(history, persona, intel, asked)
+        cached = await self._acached(key)
+        if cached is not None:
+            self._observe(start, "cache")
+            yield cached
+            return
+
+        if isinstance(self.llm_client, MockLLMClient):
+            reply = await self._aremember(key, _rule_based_reply(history, persona, intel, asked))
+            self._observe(start, "rule")
+            yield reply
+            return
+
+        messages = self._build_messages(history, persona, intel, asked, profile, summary, offset)
+        chunks: List[str] = []
         try:
-            return self.llm_client.generate(messages)
+            async for chunk in self.llm_client.astream(messages):
+                chunks.append(chunk)
+                yield chunk
         except Exception:
-            return _rule_based_reply(history, persona, intel, asked)
+            # Once tokens have reached the client the partial reply stands
+            if not chunks:
+                yield self._fallback(start, history, persona, intel, asked)
+            else:
+                self._observe(start, "partial")
+            return
+        self._observe(start, "llm")
+        await self._aremember(key, "".join(chunks).strip())
 
     def normal_reply(self, persona: str | None, last_user: str) -> str:
-        return _normal_reply(persona, last_user)
+        if self.cache is None or not self.cache.enabled_for(persona):
+            return _normal_reply(persona, last_user)
+        key = ReplyCache.make_key("normal", _persona_key(persona), " ".join((last_user or "").lower().split()))
+        cached = self._cached(key, shared=False)
+        if cached is not None:
+            return cached
+        return self._remember(key, _normal_reply(persona, last_user), shared=False)
+
+    async def anormal_reply(self, persona: str | None, last_user: str) -> str:
+        # Normal replies only use the in-process tier, so nothing here waits on I/O
+        return self.normal_reply(persona, last_user)
@@ -0,0 +1,127 @@
+import inspect
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from .agent import HoneyPotAgent, close_http_clients, get_async_http_client, get_llm_client, get_reply_cache
+from .config import ALLOW_LOCAL_STATE, RATE_LIMIT_IP_PER_MIN, WORKERS
+from .evidence import get_evidence_sink
+from .intel_index import InMemoryIntelIndex, get_intel_index
+from .metrics import REPLY_CACHE_ENTRIES, SESSION_STORE_BYTES, SESSION_STORE_REMOVED, SESSION_STORE_SESSIONS
+from .session_store import InMemorySessionStore, RateLimiter, get_rate_limiter, get_session_store
+
+
+@dataclass
+class Backends:
+    store: Any
+    rate_limiter: Any
+    ip_rate_limiter: Any
+    agent: HoneyPotAgent
+    intel_index: Any
+    # None unless EVIDENCE_PATH is set
+    evidence: Any
+    pid: int
+
+
+_backends: Backends | None = None
+
+
+def _check_shared_state(backends: Backends) -> None:
+    # Every worker process gets its own copy of in-memory state, so with more
+    # than one worker a session's turns and rate limits split across processes
+    local = [
+        name
+        for name, backend, kind in (
+            ("session store", backends.store, InMemorySessionStore),
+            ("rate limiter", backends.rate_limiter, RateLimiter),
+            ("intel index", backends.intel_index, InMemoryIntelIndex),
+        )
+        if isinstance(backend, kind)
+    ]
+    if WORKERS <= 1 or not local:
+        return
+    message = (
+        f"{' and '.join(local)} kept in process memory with WEB_CONCURRENCY={WORKERS}; "
+        "set USE_REDIS=true and REDIS_URL so all workers share sessions and rate limits"
+    )
+    if not ALLOW_LOCAL_STATE:
+        raise RuntimeError(message + " (or ALLOW_LOCAL_STATE=true to run anyway)")
+    logging.getLogger("app").warning(message)
+
+
+def create_backends() -> Backends:
+    backends = Backends(
+        store=get_session_store(),
+        rate_limiter=get_rate_limiter(),
+        ip_rate_limiter=get_rate_limiter(RATE_LIMIT_IP_PER_MIN),
+        agent=HoneyPotAgent(get_llm_client(), get_reply_cache()),
+        intel_index=get_intel_index(),
+        evidence=get_evidence_sink(),
+        pid=os.getpid(),
+    )
+    try:
+        _check_shared_state(backends)
+    except Exception:
+        for resource in (backends.store, backends.intel_index, backends.evidence):
+            result = _close(resource)
+            if inspect.iscoroutine(result):
+                result.close()
+        raise
+    return backends
+
+
+def get_backends() -> Backends:
+    # Built lazily for callers that skip the lifespan (in-process benchmarks, scripts);
+    # a forked worker never reuses the parent's connections or threads
+    global _backends
+    if _backends is None or _backends.pid != os.getpid():
+        _backends = create_backends()
+    return _backends
+
+
+def update_stats_gauges() -> None:
+    # Called when /metrics is rendered: the gauges are snapshots of this worker's backends
+    backends = _backends
+    if backends is None or backends.pid != os.getpid():
+        return
+    if isinstance(backends.store, InMemorySessionStore):
+        stats = backends.store.stats()
+        SESSION_STORE_SESSIONS.set(stats["sessions"])
+        SESSION_STORE_BYTES.set(stats["bytes"])
+        for reason in ("evicted", "expired"):
+            SESSION_STORE_REMOVED.set(stats[reason], reason=reason)
+    if backends.agent.cache is not None:
+        REPLY_CACHE_ENTRIES.set(backends.agent.cache.stats()["size"])
+
+
+def _close(resource: Any) -> Any:
+    close = getattr(resource, "close", None)
+    return close() if close is not None else None
+
+
+async def open_backends() -> Backends:
+    # Called from the lifespan handler, i.e. once per worker after it has started
+    backends = get_backends()
+    get_async_http_client()
+    return backends
+
+
+async def close_backends() -> None:
+    global _backends
+    backends, _backends = _backends, None
+    await close_http_clients()
+    if backends is None:
+        return
+    resources = (
+        backends.store,
+        backends.rate_limiter,
+        backends.ip_rate_limiter,
+        backends.intel_index,
+        backends.evidence,
+        backends.agent.cache,
+    )
+    for resource in resources:
+        result = _close(resource)
+        if inspect.isawaitable(result):
+            await result
@@ -0,0 +1,249 @@
+import argparse
+import bisect
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from .config import BLOCKLIST_PATH, BLOCKLIST_RELOAD_SECONDS, INTEL_INDEX_TTL_SECONDS
+from .intel_index import link_domain, normalize_identifier, top_key
+
+MAGIC = b"HPBLOOM1"
+# magic, bits in the filter, hash functions, entries; 32 bytes, so the bit
+# array and the fingerprints that follow stay 8-byte aligned in the mapping
+HEADER = struct.Struct("<8sQQQ")
+MASK64 = (1 << 64) - 1
+# Normalized the same way as the intel index, so its values can be loaded as-is
+FIELDS = ("upi_ids", "bank_accounts", "domains")
+
+
+def blocklist_key(field: str, value: str) -> str:
+    return f"{field}:{normalize_identifier(field, value)}"
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def _hashes(key: str) -> Tuple[int, int]:
+    digest = _digest(key)
+    # The first half doubles as the exact-match fingerprint
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+def intel_keys(found: Dict[str, List[str]]) -> List[str]:
+    # Blocklist keys for intel extracted from one message; IFSC codes name a
+    # bank branch, not an account, so they are never matched
+    keys: Dict[str, None] = {}
+    for value in found.get("upi_ids", []):
+        keys[blocklist_key("upi_ids", value)] = None
+    for value in found.get("bank_accounts", []):
+        if not value.startswith("IFSC:"):
+            keys[blocklist_key("bank_accounts", value)] = None
+    for value in found.get("phishing_links", []):
+        domain = link_domain(value.lower())
+        if domain:
+            keys[f"domains:{domain}"] = None
+    return list(keys)
+
+
+class Blocklist:
+    def __init__(self, bits: memoryview, num_bits: int, num_hashes: int, fingerprints: memoryview) -> None:
+        self.bits = bits
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        # Sorted, so a Bloom hit is confirmed by binary search
+        self.fingerprints = fingerprints
+        self._mmap: mmap.mmap | None = None
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def __contains__(self, key: str) -> bool:
+        h1, h2 = _hashes(key)
+        bits, num_bits = self.bits, self.num_bits
+        for i in range(self.num_hashes):
+            # Same uint64 wrap-around as the vectorized build
+            position = ((h1 + i * h2) & MASK64) % num_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        # A plain bisect over the mapped array; numpy's per-call overhead is larger
+        # than the twenty-odd probes for a few million entries
+        index = bisect.bisect_left(self.fingerprints, h1)
+        return index < len(self.fingerprints) and self.fingerprints[index] == h1
+
+    def check(self, found: Dict[str, List[str]]) -> List[str]:
+        return [key for key in intel_keys(found) if key in self]
+
+    @classmethod
+    def build(cls, keys: Iterable[str], fp_rate: float = 0.001) -> "Blocklist":
+        pairs = np.frombuffer(b"".join(map(_digest, set(keys))), dtype="<u8").reshape(-1, 2)
+        count = len(pairs)
+        num_bits = max(64, int(math.ceil(-max(count, 1) * math.log(fp_rate) / math.log(2) ** 2)))
+        num_bits = (num_bits + 63) // 64 * 64
+        num_hashes = max(1, round(num_bits / max(count, 1) * math.log(2)))
+        flags = np.zeros(num_bits, dtype=bool)
+        h1, h2 = pairs[:, 0], pairs[:, 1] | np.uint64(1)
+        for i in range(num_hashes):
+            flags[(h1 + np.uint64(i) * h2) % np.uint64(num_bits)] = True
+        bits = np.packbits(flags, bitorder="little")
+        fingerprints = np.unique(h1).astype("<u8")
+        return cls(memoryview(bits.tobytes()), num_bits, num_hashes, memoryview(fingerprints.tobytes()).cast("Q"))
+
+    def save(self, path: str) -> None:
+        # Written next to the target and renamed, so a running server never
+        # maps a half-written file
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as handle:
+            handle.write(HEADER.pack(MAGIC, self.num_bits, self.num_hashes, len(self.fingerprints)))
+            handle.write(self.bits)
+            handle.write(self.fingerprints)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Blocklist":
+        # Memory-mapped: startup cost does not grow with the number of entries,
+        # and worker processes share the pages
+        with open(path, "rb") as handle:
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_bits, num_hashes, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            data.close()
+            raise ValueError(f"{path} is not a blocklist file")
+        start = HEADER.size
+        end = start + num_bits // 8
+        view = memoryview(data)
+        fingerprints = view[end : end + count * 8].cast("Q")
+        blocklist = cls(view[start:end], num_bits, num_hashes, fingerprints)
+        blocklist._mmap = data
+        return blocklist
+
+
+_blocklist: Blocklist | None = None
+_loaded_mtime = 0.0
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+def get_blocklist() -> Blocklist | None:
+    # Picks up a rebuilt file (same path, atomically replaced) without a restart
+    global _blocklist, _loaded_mtime, _next_check
+    if not BLOCKLIST_PATH:
+        return None
+    now = time.monotonic()
+    if now < _next_check:
+        return _blocklist
+    with _lock:
+        if now < _next_check:
+            return _blocklist
+        _next_check = now + BLOCKLIST_RELOAD_SECONDS
+        try:
+            mtime = os.stat(BLOCKLIST_PATH).st_mtime
+            if mtime != _loaded_mtime:
+                _blocklist = Blocklist.load(BLOCKLIST_PATH)
+                _loaded_mtime = mtime
+        except (OSError, ValueError):
+            pass
+    return _blocklist
+
+
+def _guess_field(value: str) -> str:
+    if "@" in value and "/" not in value:
+        return "upi_ids"
+    if value.replace(" ", "").replace("-", "").isdigit():
+        return "bank_accounts"
+    return "domains"
+
+
+def _read_keys(path: str, min_count: int) -> Iterator[str]:
+    # JSON run summaries from `python -m app.replay --intel`, or text files with
+    # one identifier per line, optionally prefixed by "field:"
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as handle:
+            intel = json.load(handle).get("intel", {})
+        for field, entries in intel.items():
+            for entry in entries:
+                if entry.get("conversations", 1) < min_count:
+                    continue
+                value = str(entry["value"])
+                if field == "phishing_links":
+                    domain = link_domain(value.lower())
+                    if domain:
+                        yield f"domains:{domain}"
+                elif field in FIELDS and not value.startswith("IFSC:"):
+                    yield blocklist_key(field, value)
+        return
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            value = line.strip()
+            if not value or value.startswith("#"):
+                continue
+            field, sep, rest = value.partition(":")
+            if sep and field in FIELDS:
+                yield blocklist_key(field, rest)
+            elif "://" in value:
+                yield f"domains:{link_domain(value.lower())}"
+            else:
+                yield blocklist_key(_guess_field(value), value)
+
+
+def _redis_keys(redis_url: str, min_count: int) -> Iterator[str]:
+    # Identifiers seen in at least min_count sessions of the live intel index
+    import redis
+
+    client = redis.Redis.from_url(redis_url, decode_responses=True)
+    try:
+        # Identifiers last seen before the TTL have expired from the index
+        oldest = time.time() - INTEL_INDEX_TTL_SECONDS if INTEL_INDEX_TTL_SECONDS > 0 else 0
+        for field in FIELDS:
+            values = client.zrangebyscore(top_key(field, "sessions"), min_count, "+inf")
+            if not values:
+                continue
+            seen = client.zmscore(top_key(field, "seen"), values)
+            for value, last in zip(values, seen):
+                if value.startswith("IFSC:") or (oldest and (last is None or last < oldest)):
+                    continue
+                yield f"{field}:{value}"
+    finally:
+        client.close()
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build a known-bad identifier blocklist")
+    parser.add_argument("output", help="Where to write the blocklist file")
+    parser.add_argument("inputs", nargs="*", help="Text files (one identifier per line) or replay --intel JSON")
+    parser.add_argument("--redis", help="Also take identifiers from the intel index in this Redis")
+    parser.add_argument("--min-count", type=int, default=1, help="Minimum conversations/sessions per identifier")
+    parser.add_argument("--fp-rate", type=float, default=0.001)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    keys = set()
+    for path in args.inputs:
+        keys.update(_read_keys(path, args.min_count))
+    if args.redis:
+        keys.update(_redis_keys(args.redis, args.min_count))
+    blocklist = Blocklist.build(keys, args.fp_rate)
+    blocklist.save(args.output)
+    print(
+        json.dumps(
+            {
+                "entries": len(blocklist),
+                "bits": blocklist.num_bits,
+                "hashes": blocklist.num_hashes,
+                "seconds": round(time.perf_counter() - started, 3),
+                "output": args.output,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .config import CAMPAIGN_DETECTION, CAMPAIGN_MAX, CAMPAIGN_MIN_SHINGLES, CAMPAIGN_SIMILARITY
+from .metrics import CAMPAIGN_LOOKUPS
+from .scam_detector import detect_scam_details
+from .signals import MessageSignals
+
+DIGITS_RE = re.compile(r"\d+")
+WORD_RE = re.compile(r"[a-z0-9]+")
+# Mixes a word hash into the one before it to hash a bigram
+_BIGRAM_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+@dataclass
+class Campaign:
+    campaign_id: str
+    signature: np.ndarray
+    band_keys: List[bytes]
+    # Verdict of the message that founded the campaign, reused for near-duplicates
+    details: Dict[str, object]
+    # What the founder's verdict was based on; a member with anything else is rescored
+    evidence: frozenset
+    sample: str
+    first_seen: float
+    last_seen: float
+    messages: int = 1
+    sessions: int = 0
+
+
+class CampaignIndex:
+    def __init__(
+        self,
+        similarity: float = 0.6,
+        min_shingles: int = 6,
+        max_campaigns: int = 50000,
+        num_perm: int = 64,
+        bands: int = 16,
+        seed: int = 1,
+    ) -> None:
+        # MinHash LSH: two messages share a band bucket with high probability once
+        # their shingle sets overlap by roughly (1 / bands) ** (1 / rows per band)
+        # (0.5 for 16 x 4); candidates are then checked against `similarity`
+        self.similarity = similarity
+        self.min_shingles = min_shingles
+        self.max_campaigns = max_campaigns
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing; odd multipliers, uint64 arithmetic wraps
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._campaigns: "OrderedDict[str, Campaign]" = OrderedDict()
+        # Normalized text -> campaign, so repeats of one text skip MinHash entirely
+        self._exact: "OrderedDict[str, str]" = OrderedDict()
+        self._hashes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _hash(self, word: str) -> int:
+        value = self._hashes.get(word)
+        if value is None:
+            data = word.encode("utf-8")
+            value = zlib.crc32(data) | (zlib.crc32(data, 0x9E3779B9) << 32)
+            if len(self._hashes) < 200000:
+                self._hashes[word] = value
+        return value
+
+    @staticmethod
+    def normalize(lower: str) -> str:
+        # Every number collapsed, so amounts, phone numbers and reference ids do
+        # not split a campaign
+        return DIGITS_RE.sub("0", lower)
+
+    def signature(self, text: str) -> np.ndarray | None:
+        # MinHash over word bigrams of normalized text; repeated bigrams do not
+        # change a minimum, so they need no dedupe
+        words = WORD_RE.findall(text)
+        if len(words) <= self.min_shingles:
+            return None
+        hashes = np.fromiter(map(self._hash, words), dtype=np.uint64, count=len(words))
+        bigrams = hashes[:-1] * _BIGRAM_MIX + hashes[1:]
+        return ((bigrams[:, None] * self._a + self._b) >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        data = signature.tobytes()
+        step = self.rows * 4
+        return [data[i * step : (i + 1) * step] for i in range(self.bands)]
+
+    def find(self, lower: str) -> Tuple[Campaign | None, np.ndarray | None, str]:
+        # (campaign, signature, normalized text); the signature is None when the
+        # text was seen before or is too short to cluster. Read-only: a match only
+        # counts once its verdict is final and the caller joins it
+        text = self.normalize(lower)
+        with self._lock:
+            campaign_id = self._exact.get(text)
+            campaign = self._campaigns.get(campaign_id) if campaign_id else None
+            if campaign is not None:
+                return campaign, None, text
+        signature = self.signature(text)
+        if signature is None:
+            return None, None, text
+        return self.match(signature), signature, text
+
+    def join(self, campaign: Campaign, text: str) -> None:
+        with self._lock:
+            if campaign.campaign_id in self._campaigns:
+                self._seen(campaign)
+        self._remember(text, campaign.campaign_id)
+
+    def _seen(self, campaign: Campaign) -> None:
+        campaign.messages += 1
+        campaign.last_seen = time.time()
+        self._campaigns.move_to_end(campaign.campaign_id)
+
+    def _remember(self, text: str, campaign_id: str) -> None:
+        with self._lock:
+            self._exact[text] = campaign_id
+            self._exact.move_to_end(text)
+            if len(self._exact) > max(1000, self.max_campaigns * 4):
+                self._exact.popitem(last=False)
+
+    def match(self, signature: np.ndarray) -> Campaign | None:
+        band_keys = self._band_keys(signature)
+        best, best_similarity = None, self.similarity
+        seen = set()
+        with self._lock:
+            for band, key in enumerate(band_keys):
+                for campaign_id in self._buckets[band].get(key, ()):
+                    if campaign_id in seen:
+                        continue
+                    seen.add(campaign_id)
+                    campaign = self._campaigns[campaign_id]
+                    similarity = float(np.count_nonzero(campaign.signature == signature)) / len(signature)
+                    if similarity >= best_similarity:
+                        best, best_similarity = campaign, similarity
+        return best
+
+    def add(
+        self, signature: np.ndarray, details: Dict[str, object], evidence: frozenset, message: str, text: str = ""
+    ) -> Campaign:
+        band_keys = self._band_keys(signature)
+        # Named after the founding message, so workers that see the same flood agree
+        campaign_id = "cmp-" + hashlib.blake2b(signature.tobytes(), digest_size=6).hexdigest()
+        now = time.time()
+        campaign = Campaign(campaign_id, signature, band_keys, details, evidence, message[:200], now, now)
+        with self._lock:
+            existing = self._campaigns.get(campaign_id)
+            if existing is not None:
+                self._seen(existing)
+                return existing
+            if self.max_campaigns > 0 and len(self._campaigns) >= self.max_campaigns:
+                self._drop(self._campaigns.popitem(last=False)[1])
+            self._campaigns[campaign_id] = campaign
+            for band, key in enumerate(band_keys):
+                self._buckets[band].setdefault(key, []).append(campaign_id)
+        if text:
+            self._remember(text, campaign_id)
+        return campaign
+
+    def _drop(self, campaign: Campaign) -> None:
+        for band, key in enumerate(campaign.band_keys):
+            ids = self._buckets[band].get(key)
+            if ids is None:
+                continue
+            ids.remove(campaign.campaign_id)
+            if not ids:
+                del self._buckets[band][key]
+
+    def tag_session(self, campaign_id: str) -> None:
+        with self._lock:
+            campaign = self._campaigns.get(campaign_id)
+            if campaign is not None:
+                campaign.sessions += 1
+
+    def top(self, limit: int = 20, min_messages: int = 2) -> List[Dict[str, Any]]:
+        with self._lock:
+            campaigns = [c for c in self._campaigns.values() if c.messages >= min_messages]
+        campaigns.sort(key=lambda c: (-c.messages, c.first_seen))
+        return [
+            {
+                "campaign_id": c.campaign_id,
+                "messages": c.messages,
+                "sessions": c.sessions,
+                "first_seen": c.first_seen,
+                "last_seen": c.last_seen,
+                "scam_detected": bool(c.details.get("scam_detected")),
+                "score": int(c.details.get("score") or 0),
+                "intent": str(c.details.get("intent") or "unknown"),
+                "sample": c.sample,
+            }
+            for c in campaigns[:limit]
+        ]
+
+    def __len__(self) -> int:
+        return len(self._campaigns)
+
+
+_index: CampaignIndex | None = None
+
+
+def get_campaign_index() -> CampaignIndex | None:
+    global _index
+    if CAMPAIGN_DETECTION and _index is None:
+        _index = CampaignIndex(CAMPAIGN_SIMILARITY, CAMPAIGN_MIN_SHINGLES, CAMPAIGN_MAX)
+    return _index
+
+
+def _evidence(signals: MessageSignals) -> frozenset:
+    return frozenset(
+        [*signals.keywords, *(["url"] if signals.urls else []), *(["contact"] if signals.has_contact else [])]
+    )
+
+
+def detect_with_campaigns(
+    message: str, signals: MessageSignals, ml_score: float | None = None
+) -> Dict[str, object]:
+    # Near-duplicates of a known scam campaign reuse its verdict and skip scoring
+    # (and the ML model) only when they match exactly the same keywords, hint
+    # words included, links and contacts as the founding message; anything else
+    # is scored. Only messages scored as scams found a campaign
+    index = get_campaign_index()
+    if index is None:
+        return detect_scam_details(message, signals, ml_score)
+    campaign, signature, text = index.find(signals.lower)
+    if campaign is None and signature is None:
+        CAMPAIGN_LOOKUPS.inc(result="skipped")
+        return detect_scam_details(message, signals, ml_score)
+    evidence = _evidence(signals)
+    if campaign is not None and evidence == campaign.evidence:
+        CAMPAIGN_LOOKUPS.inc(result="hit")
+        details = campaign.details
+        index.join(campaign, text)
+    else:
+        details = detect_scam_details(message, signals, ml_score)
+        if not details.get("scam_detected"):
+            CAMPAIGN_LOOKUPS.inc(result="not_scam")
+            return details
+        if campaign is None:
+            CAMPAIGN_LOOKUPS.inc(result="new")
+            campaign = index.add(signature, details, evidence, message, text)
+        else:
+            CAMPAIGN_LOOKUPS.inc(result="rescored")
+            index.join(campaign, text)
+    return {**details, "reasons": list(details["reasons"]), "campaign_id": campaign.campaign_id}
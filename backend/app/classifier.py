@@ -0,0 +1,153 @@
+import argparse
+import json
+import re
+import zlib
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9@._/:-]+")
+
+
+class HashingVectorizer:
+    def __init__(self, n_features: int = 2**18, cache_size: int = 200000) -> None:
+        self.n_features = n_features
+        self.cache_size = cache_size
+        # Token -> column; hashing is stable across processes (crc32, not hash())
+        self._columns: Dict[str, int] = {}
+
+    def _column(self, token: str) -> int:
+        column = self._columns.get(token)
+        if column is None:
+            column = zlib.crc32(token.encode("utf-8")) % self.n_features
+            if len(self._columns) < self.cache_size:
+                self._columns[token] = column
+        return column
+
+    def _tokens(self, text: str) -> List[str]:
+        words = TOKEN_RE.findall((text or "").lower())
+        # Unigrams plus bigrams; bigrams catch phrases like "processing fee"
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Sparse rows as (row ids, column ids, values), L2-normalized per row
+        rows: List[int] = []
+        columns: List[int] = []
+        for row, text in enumerate(texts):
+            for token in self._tokens(text):
+                rows.append(row)
+                columns.append(self._column(token))
+        row_ids = np.asarray(rows, dtype=np.int64)
+        col_ids = np.asarray(columns, dtype=np.int64)
+        values = np.ones(len(col_ids), dtype=np.float32)
+        if len(row_ids):
+            norms = np.sqrt(np.bincount(row_ids, minlength=len(texts))).astype(np.float32)
+            values /= norms[row_ids]
+        return row_ids, col_ids, values
+
+
+class LinearScamClassifier:
+    def __init__(
+        self,
+        weights: np.ndarray | None = None,
+        bias: float = 0.0,
+        n_features: int = 2**18,
+        threshold: float = 0.5,
+    ) -> None:
+        self.vectorizer = HashingVectorizer(n_features)
+        self.weights = weights if weights is not None else np.zeros(n_features, dtype=np.float32)
+        self.bias = float(bias)
+        self.threshold = threshold
+
+    def decision_function(self, texts: Sequence[str]) -> np.ndarray:
+        # Sparse matrix-vector product for the whole batch at once
+        row_ids, col_ids, values = self.vectorizer.transform(texts)
+        scores = np.bincount(row_ids, weights=self.weights[col_ids] * values, minlength=len(texts))
+        return scores + self.bias
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-self.decision_function(texts)))
+
+    def fit(
+        self,
+        texts: Sequence[str],
+        labels: Sequence[int],
+        epochs: int = 10,
+        learning_rate: float = 0.5,
+        l2: float = 1e-6,
+        batch_size: int = 256,
+        seed: int = 0,
+    ) -> "LinearScamClassifier":
+        # Logistic regression by minibatch SGD, vectorized per batch
+        y = np.asarray(labels, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        order = np.arange(len(texts))
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for start in range(0, len(order), batch_size):
+                idx = order[start : start + batch_size]
+                batch = [texts[i] for i in idx]
+                row_ids, col_ids, values = self.vectorizer.transform(batch)
+                scores = np.bincount(row_ids, weights=self.weights[col_ids] * values, minlength=len(batch))
+                error = 1.0 / (1.0 + np.exp(-(scores + self.bias))) - y[idx]
+                grad = np.bincount(col_ids, weights=error[row_ids] * values, minlength=self.vectorizer.n_features)
+                self.weights -= learning_rate * (grad / len(batch) + l2 * self.weights).astype(np.float32)
+                self.bias -= learning_rate * float(error.mean())
+        return self
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=np.float32(self.bias),
+            n_features=np.int64(self.vectorizer.n_features),
+            threshold=np.float32(self.threshold),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LinearScamClassifier":
+        with np.load(path) as data:
+            return cls(
+                weights=data["weights"].astype(np.float32),
+                bias=float(data["bias"]),
+                n_features=int(data["n_features"]),
+                threshold=float(data["threshold"]),
+            )
+
+
+def _read_labeled(path: str) -> Iterable[Tuple[str, int]]:
+    # JSONL rows with "message" (or "text") and a "label"/"scam" field
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            text = row.get("message") or row.get("text") or ""
+            label = row.get("label", row.get("scam"))
+            if label is None:
+                continue
+            yield text, int(bool(label))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the hashed linear scam classifier")
+    parser.add_argument("data", help="JSONL file with message and label fields")
+    parser.add_argument("output", help="Where to write the .npz model")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--features", type=int, default=2**18)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    rows = list(_read_labeled(args.data))
+    texts = [text for text, _ in rows]
+    labels = [label for _, label in rows]
+    model = LinearScamClassifier(n_features=args.features, threshold=args.threshold)
+    model.fit(texts, labels, epochs=args.epochs)
+    predicted = model.predict_proba(texts) >= model.threshold
+    accuracy = float(np.mean(predicted == np.asarray(labels, dtype=bool))) if rows else 0.0
+    model.save(args.output)
+    print(json.dumps({"examples": len(rows), "train_accuracy": round(accuracy, 4), "output": args.output}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import json
+import logging
+import zlib
+from typing import Any, Callable, Dict, Tuple
+
+from .config import SESSION_CODEC, SESSION_COMPRESS_LEVEL, SESSION_COMPRESS_MIN_BYTES, SESSION_COMPRESSION
+
+# Encoded sessions start with a NUL byte, which JSON text never does, so keys
+# written as plain JSON by older versions still decode
+MAGIC = b"\x00S"
+VERSION = 1
+SERIALIZERS = {"json": 1, "msgpack": 2}
+COMPRESSIONS = {"none": 0, "zlib": 1, "zstd": 2}
+
+
+def _json() -> Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]:
+    try:
+        import orjson
+
+        return orjson.dumps, orjson.loads
+    except ImportError:
+        return (
+            lambda value: json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"),
+            json.loads,
+        )
+
+
+def _msgpack() -> Tuple[Callable[[Any], bytes], Callable[[bytes], Any]] | None:
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack.packb, lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _zstd(level: int) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]] | None:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    compressor = zstandard.ZstdCompressor(level=level)
+    decompressor = zstandard.ZstdDecompressor()
+    return compressor.compress, decompressor.decompress
+
+
+class SessionCodec:
+    def __init__(self, serializer: str = "json", compression: str = "none", min_bytes: int = 1024, level: int = 3) -> None:
+        # Optional packages fall back to what is always available: msgpack to
+        # JSON, zstd to zlib
+        self._serializers: Dict[int, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {1: _json()}
+        packer = _msgpack()
+        if packer is not None:
+            self._serializers[2] = packer
+        self.legacy = serializer == "legacy"
+        if serializer == "msgpack" and packer is None:
+            logging.getLogger("app").warning("SESSION_CODEC=msgpack but msgpack is not installed; using json")
+        self.serializer = serializer if SERIALIZERS.get(serializer) in self._serializers else "json"
+
+        self._compressors: Dict[int, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+            1: (lambda data: zlib.compress(data, level), zlib.decompress)
+        }
+        zstd = _zstd(level)
+        if zstd is not None:
+            self._compressors[2] = zstd
+        if compression == "zstd" and zstd is None:
+            logging.getLogger("app").warning("SESSION_COMPRESSION=zstd but zstandard is not installed; using zlib")
+            compression = "zlib"
+        self.compression = compression if compression in COMPRESSIONS else "none"
+        self.min_bytes = min_bytes
+
+    def encode(self, session: Dict[str, Any]) -> bytes:
+        if self.legacy:
+            # Plain JSON text, readable by versions that predate the codec
+            return json.dumps(session).encode("utf-8")
+        serializer = SERIALIZERS[self.serializer]
+        body = self._serializers[serializer][0](session)
+        compression = COMPRESSIONS[self.compression]
+        # Small sessions are stored as-is; compressing them costs more than it saves
+        if compression and len(body) >= self.min_bytes:
+            body = self._compressors[compression][0](body)
+        else:
+            compression = 0
+        return MAGIC + bytes((VERSION, serializer, compression)) + body
+
+    def decode(self, data: bytes | str) -> Dict[str, Any]:
+        # Any unreadable value (truncated, corrupt, or not a session) raises
+        # ValueError, which callers treat as a missing session
+        if isinstance(data, str) or not data.startswith(MAGIC):
+            return self._checked(json.loads, data)
+        if len(data) < 5:
+            raise ValueError("truncated session header")
+        version, serializer, compression = data[2], data[3], data[4]
+        if version != VERSION:
+            raise ValueError(f"unsupported session encoding version {version}")
+        body = data[5:]
+        if compression:
+            codec = self._compressors.get(compression)
+            if codec is None:
+                raise ValueError(f"session compressed with an unavailable codec ({compression})")
+            try:
+                body = codec[1](body)
+            except Exception as exc:
+                raise ValueError(f"corrupt session body: {exc}") from exc
+        unpack = self._serializers.get(serializer)
+        if unpack is None:
+            raise ValueError(f"session serialized with an unavailable codec ({serializer})")
+        return self._checked(unpack[1], body)
+
+    @staticmethod
+    def _checked(load: Callable[[Any], Any], data: Any) -> Dict[str, Any]:
+        try:
+            session = load(data)
+        except Exception as exc:
+            raise ValueError(f"corrupt session body: {exc}") from exc
+        if not isinstance(session, dict):
+            raise ValueError("session is not a mapping")
+        return session
+
+
+def get_session_codec() -> SessionCodec:
+    return SessionCodec(SESSION_CODEC, SESSION_COMPRESSION, SESSION_COMPRESS_MIN_BYTES, SESSION_COMPRESS_LEVEL)
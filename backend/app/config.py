@@ -9,11 +9,92 @@ def _get_bool(name: str, default: bool = False) -> bool:
 API_KEY = os.getenv("API_KEY", "changeme")
 REDIS_URL = os.getenv("REDIS_URL", "")
 USE_REDIS = _get_bool("USE_REDIS", bool(REDIS_URL))
+REDIS_ASYNC = _get_bool("REDIS_ASYNC", True)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+# Worker processes (uvicorn --workers / gunicorn -w read the same variable)
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+ALLOW_LOCAL_STATE = _get_bool("ALLOW_LOCAL_STATE", False)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "100000"))
+SESSION_MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", "200"))
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+SESSION_LOCK_SHARDS = int(os.getenv("SESSION_LOCK_SHARDS", "16"))
+# Encoding of whole-session Redis keys: json, msgpack (json if not installed) or
+# legacy (plain JSON text, for rolling back to older versions)
+SESSION_CODEC = os.getenv("SESSION_CODEC", "json").lower()
+SESSION_COMPRESSION = os.getenv("SESSION_COMPRESSION", "zlib").lower()
+SESSION_COMPRESS_MIN_BYTES = int(os.getenv("SESSION_COMPRESS_MIN_BYTES", "1024"))
+SESSION_COMPRESS_LEVEL = int(os.getenv("SESSION_COMPRESS_LEVEL", "3"))
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "mock").lower()
 LLM_MODEL = os.getenv("LLM_MODEL", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+# Used with LLM_PROVIDER=router
+LLM_ROUTER_PROVIDERS = [p.strip().lower() for p in os.getenv("LLM_ROUTER_PROVIDERS", "openai,gemini").split(",") if p.strip()]
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "100"))
+LLM_HEDGE = _get_bool("LLM_HEDGE", True)
+LLM_HEDGE_DELAY_MS = int(os.getenv("LLM_HEDGE_DELAY_MS", "1500"))
+LLM_HEDGE_MIN_MS = int(os.getenv("LLM_HEDGE_MIN_MS", "200"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP2 = _get_bool("LLM_HTTP2", True)
+LLM_HISTORY_TURNS = int(os.getenv("LLM_HISTORY_TURNS", "12"))
+LLM_MAX_PROMPT_TOKENS = int(os.getenv("LLM_MAX_PROMPT_TOKENS", "3000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_LATENCY_BUDGET_MS = int(os.getenv("LLM_LATENCY_BUDGET_MS", "4000"))
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+# A call slower than this counts as a failure; defaults to the latency budget,
+# since callers have already fallen back by then
+LLM_BREAKER_SLOW_MS = int(os.getenv("LLM_BREAKER_SLOW_MS", str(LLM_LATENCY_BUDGET_MS or 8000)))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+REPLY_CACHE_ENABLED = _get_bool("REPLY_CACHE_ENABLED", True)
+REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "10000"))
+REPLY_CACHE_TTL = int(os.getenv("REPLY_CACHE_TTL", "3600"))
+REPLY_CACHE_REDIS = _get_bool("REPLY_CACHE_REDIS", False)
+REPLY_CACHE_DISABLED_PERSONAS = {
+    p.strip().lower() for p in os.getenv("REPLY_CACHE_DISABLED_PERSONAS", "").split(",") if p.strip()
+}
+INTEL_INDEX_ENABLED = _get_bool("INTEL_INDEX_ENABLED", True)
+INTEL_INDEX_MAX_KEYS = int(os.getenv("INTEL_INDEX_MAX_KEYS", "100000"))
+INTEL_INDEX_TTL_SECONDS = int(os.getenv("INTEL_INDEX_TTL_SECONDS", "2592000"))
+CAMPAIGN_DETECTION = _get_bool("CAMPAIGN_DETECTION", True)
+CAMPAIGN_SIMILARITY = float(os.getenv("CAMPAIGN_SIMILARITY", "0.6"))
+CAMPAIGN_MIN_SHINGLES = int(os.getenv("CAMPAIGN_MIN_SHINGLES", "6"))
+CAMPAIGN_MAX = int(os.getenv("CAMPAIGN_MAX", "50000"))
+BLOCKLIST_PATH = os.getenv("BLOCKLIST_PATH", "")
+BLOCKLIST_RELOAD_SECONDS = int(os.getenv("BLOCKLIST_RELOAD_SECONDS", "30"))
+# Append-only SQLite record of turns and intel; empty disables it. EVIDENCE_SYNC
+# is the SQLite synchronous level for each group commit: full (fsync per commit)
+# or normal (fsync at WAL checkpoints only)
+EVIDENCE_PATH = os.getenv("EVIDENCE_PATH", "")
+EVIDENCE_QUEUE_SIZE = int(os.getenv("EVIDENCE_QUEUE_SIZE", "50000"))
+EVIDENCE_BATCH_SIZE = int(os.getenv("EVIDENCE_BATCH_SIZE", "500"))
+EVIDENCE_SYNC = os.getenv("EVIDENCE_SYNC", "full").lower()
+SCAM_MODEL_PATH = os.getenv("SCAM_MODEL_PATH", "")
+# A model score at or below SCAM_ML_VETO overrules heuristic verdicts scoring
+# under SCAM_ML_VETO_MAX_SCORE (e.g. a lone "upi" mention)
+SCAM_ML_VETO = float(os.getenv("SCAM_ML_VETO", "0.2"))
+SCAM_ML_VETO_MAX_SCORE = int(os.getenv("SCAM_ML_VETO_MAX_SCORE", "50"))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_ASYNC = _get_bool("LOG_ASYNC", True)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+# event=rate pairs, e.g. "message_handled=0.1" keeps one in ten of those lines
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, _, rate in (item.partition("=") for item in os.getenv("LOG_SAMPLE_RATES", "").split(","))
+    if name.strip() and rate.strip()
+}
+METRICS_ENABLED = _get_bool("METRICS_ENABLED", True)
 RATE_LIMIT_PER_MIN = int(os.getenv("RATE_LIMIT_PER_MIN", "60"))
+RATE_LIMIT_IP_PER_MIN = int(os.getenv("RATE_LIMIT_IP_PER_MIN", "600"))
 CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
 PERSONA_DEFAULT = os.getenv("PERSONA_DEFAULT", "elderly").lower()
@@ -0,0 +1,268 @@
+import argparse
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .config import EVIDENCE_BATCH_SIZE, EVIDENCE_PATH, EVIDENCE_QUEUE_SIZE, EVIDENCE_SYNC
+from .intel_index import link_domain, normalize_identifier
+from .metrics import EVIDENCE_BATCH_RECORDS, EVIDENCE_COMMIT_SECONDS, EVIDENCE_DROPPED, EVIDENCE_QUEUE_DEPTH
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    session_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    persona TEXT,
+    message TEXT NOT NULL,
+    reply TEXT NOT NULL,
+    scam_detected INTEGER NOT NULL,
+    score INTEGER,
+    intent TEXT,
+    reasons TEXT,
+    campaign_id TEXT
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, turn);
+CREATE TABLE IF NOT EXISTS intel (
+    id INTEGER PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    session_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    normalized TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS intel_value ON intel (field, normalized);
+CREATE INDEX IF NOT EXISTS intel_session ON intel (session_id);
+"""
+# Rows are evidence: once committed they are never changed or removed
+for _table in ("turns", "intel"):
+    for _action in ("UPDATE", "DELETE"):
+        SCHEMA += (
+            f"CREATE TRIGGER IF NOT EXISTS {_table}_no_{_action.lower()} BEFORE {_action} ON {_table} "
+            "BEGIN SELECT RAISE(ABORT, 'evidence tables are append-only'); END;\n"
+        )
+
+_STOP = object()
+
+
+def connect(path: str, sync: str = "full") -> sqlite3.Connection:
+    # Autocommit mode; transactions are opened explicitly, one per batch
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={'NORMAL' if sync == 'normal' else 'FULL'}")
+    # Workers share the file; a writer waits for another's commit instead of failing
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+def intel_rows(found: Dict[str, List[str]]) -> List[Tuple[str, str, str]]:
+    # (field, value as seen, normalized value); links also file their domain
+    rows: List[Tuple[str, str, str]] = []
+    for field in ("upi_ids", "bank_accounts", "phishing_links"):
+        for value in found.get(field, []):
+            normalized = normalize_identifier(field, value)
+            rows.append((field, value, normalized))
+            if field == "phishing_links":
+                domain = link_domain(normalized)
+                if domain:
+                    rows.append(("domains", value, domain))
+    return rows
+
+
+class EvidenceSink:
+    def __init__(self, path: str, queue_size: int = 50000, batch_size: int = 500, sync: str = "full") -> None:
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        # Opened here so a bad path fails at startup, not on the writer thread
+        self._conn = connect(path, sync)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(
+        self,
+        session_id: str,
+        turn: int,
+        persona: str | None,
+        message: str,
+        reply: str,
+        details: Dict[str, object],
+        found: Dict[str, List[str]],
+    ) -> None:
+        # Request path: one non-blocking put; encoding and the write happen on the
+        # writer thread. A full queue drops the record rather than stall the turn
+        item = (time.time(), session_id, turn, persona, message, reply, details, found)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            EVIDENCE_DROPPED.inc(reason="queue_full")
+
+    def _run(self) -> None:
+        # Group commit: block for the first record, then take whatever queued up
+        # meanwhile, so a burst lands in a few transactions and a single fsync each
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            EVIDENCE_QUEUE_DEPTH.set(self._queue.qsize())
+        self._conn.close()
+
+    def _write(self, batch: List[tuple]) -> None:
+        turns = []
+        intel = []
+        for recorded_at, session_id, turn, persona, message, reply, details, found in batch:
+            reasons = details.get("reasons")
+            turns.append(
+                (
+                    recorded_at,
+                    session_id,
+                    turn,
+                    persona,
+                    message,
+                    reply,
+                    int(bool(details.get("scam_detected"))),
+                    int(details["score"]) if details.get("score") is not None else None,
+                    str(details.get("intent") or "unknown"),
+                    json.dumps(list(reasons)) if reasons else None,
+                    details.get("campaign_id"),
+                )
+            )
+            intel.extend((recorded_at, session_id, turn, *row) for row in intel_rows(found))
+        try:
+            with EVIDENCE_COMMIT_SECONDS.time():
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT INTO turns (recorded_at, session_id, turn, persona, message, reply, scam_detected, "
+                    "score, intent, reasons, campaign_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    turns,
+                )
+                self._conn.executemany(
+                    "INSERT INTO intel (recorded_at, session_id, turn, field, value, normalized) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    intel,
+                )
+                self._conn.execute("COMMIT")
+        except sqlite3.Error:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            EVIDENCE_DROPPED.inc(len(batch), reason="error")
+            logging.getLogger("app").exception("evidence batch of %d records not written", len(batch))
+            return
+        EVIDENCE_BATCH_RECORDS.observe(len(batch))
+
+    def close(self) -> None:
+        # Writes out everything already queued; safe to call more than once
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        EVIDENCE_QUEUE_DEPTH.set(0)
+
+
+def get_evidence_sink() -> EvidenceSink | None:
+    if not EVIDENCE_PATH:
+        return None
+    return EvidenceSink(EVIDENCE_PATH, EVIDENCE_QUEUE_SIZE, EVIDENCE_BATCH_SIZE, EVIDENCE_SYNC)
+
+
+def _transcript(conn: sqlite3.Connection, session_id: str) -> Dict[str, Any]:
+    turns = []
+    for row in conn.execute(
+        "SELECT turn, recorded_at, persona, message, reply, scam_detected, score, intent, reasons, campaign_id "
+        "FROM turns WHERE session_id = ? ORDER BY turn, id",
+        (session_id,),
+    ):
+        turn, recorded_at, persona, message, reply, scam_detected, score, intent, reasons, campaign_id = row
+        turns.append(
+            {
+                "turn": turn,
+                "recorded_at": recorded_at,
+                "persona": persona,
+                "message": message,
+                "reply": reply,
+                "scam_detected": bool(scam_detected),
+                "score": score,
+                "intent": intent,
+                "reasons": json.loads(reasons) if reasons else [],
+                "campaign_id": campaign_id,
+            }
+        )
+    intel: Dict[str, Dict[str, Any]] = {}
+    for field, value, turn, recorded_at in conn.execute(
+        "SELECT field, value, turn, recorded_at FROM intel WHERE session_id = ? AND field != 'domains' ORDER BY id",
+        (session_id,),
+    ):
+        entry = intel.setdefault(field, {}).setdefault(value, {"value": value, "turns": [], "first_seen": recorded_at})
+        entry["turns"].append(turn)
+    return {
+        "session_id": session_id,
+        "turns": turns,
+        "intel": {field: list(values.values()) for field, values in intel.items()},
+    }
+
+
+def _sessions_with(conn: sqlite3.Connection, field: str, value: str) -> List[str]:
+    normalized = normalize_identifier(field, value)
+    rows = conn.execute(
+        "SELECT session_id, MIN(id) FROM intel WHERE field = ? AND normalized = ? GROUP BY session_id ORDER BY 2",
+        (field, normalized),
+    )
+    return [session_id for session_id, _ in rows]
+
+
+def report(path: str, session_ids: List[str], field: str | None = None, value: str | None = None) -> Iterator[Dict[str, Any]]:
+    # Full transcripts with the intel each one yielded, for the named sessions and
+    # every session an identifier was seen in
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        ids = list(session_ids)
+        if field and value:
+            ids.extend(_sessions_with(conn, field, value))
+        for session_id in dict.fromkeys(ids):
+            yield _transcript(conn, session_id)
+    finally:
+        conn.close()
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export transcripts and intel from the evidence store as JSON lines")
+    parser.add_argument("path", nargs="?", default=EVIDENCE_PATH or None, help="Evidence database (EVIDENCE_PATH)")
+    parser.add_argument("--session", action="append", default=[], help="Session id; may be repeated")
+    parser.add_argument("--field", choices=["upi_ids", "bank_accounts", "phishing_links", "domains"])
+    parser.add_argument("--value", help="Export every session this identifier was seen in")
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error("no evidence database given and EVIDENCE_PATH is not set")
+    if bool(args.field) != bool(args.value):
+        parser.error("--field and --value go together")
+    if not args.session and not args.value:
+        parser.error("give --session or --field/--value")
+    for transcript in report(args.path, args.session, args.field, args.value):
+        sys.stdout.write(json.dumps(transcript, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
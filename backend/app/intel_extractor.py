@@ -1,10 +1,7 @@
 ﻿import re
-from typing import Dict, List
+from typing import Any, Dict, Iterable, List, Tuple
 
-UPI_RE = re.compile(r"\b[a-zA-Z0-9._-]{2,256}@[a-zA-Z]{2,64}\b")
-BANK_RE = re.compile(r"\b\d{9,18}\b")
-IFSC_RE = re.compile(r"\b[A-Z]{4}0[A-Z0-9]{6}\b", re.IGNORECASE)
-URL_RE = re.compile(r"\b(?:https?://|www\.)[^\s<>\"]+\b", re.IGNORECASE)
+from .signals import MessageSignals, extract_signals
 
 
 def _normalize_url(url: str) -> str:
@@ -13,9 +10,9 @@ def _normalize_url(url: str) -> str:
     return url
 
 
-def _looks_like_phone(number: str, text: str) -> bool:
+def _looks_like_phone(number: str, lower: str) -> bool:
     if len(number) == 10 and number[0] in {"6", "7", "8", "9"}:
-        if not any(k in text.lower() for k in ("account", "bank", "a/c", "acc", "ifsc")):
+        if not any(k in lower for k in ("account", "bank", "a/c", "acc", "ifsc")):
             return True
     return False
 
@@ -29,24 +26,25 @@ def _normalize_account(num: str) -> str:
     return re.sub(r"[\s-]", "", num)
 
 
-def extract_intel(text: str) -> Dict[str, List[str]]:
+def extract_intel(text: str, signals: MessageSignals | None = None) -> Dict[str, List[str]]:
     if not text:
         return {"upi_ids": [], "bank_accounts": [], "phishing_links": []}
+    if signals is None:
+        signals = extract_signals(text)
 
-    upi_ids = [m.group(0) for m in UPI_RE.finditer(text)]
+    upi_ids = list(signals.upi_ids)
     bank_accounts = []
-    for m in BANK_RE.finditer(text):
-        raw = m.group(0)
-        if _looks_like_phone(raw, text):
+    for raw, start, end in signals.bank_numbers:
+        if _looks_like_phone(raw, signals.lower):
             continue
-        if not _has_bank_context(text, m.start(), m.end()):
+        if not _has_bank_context(signals.text, start, end):
             continue
         bank_accounts.append(_normalize_account(raw))
 
     # Add IFSC codes as labeled entries
-    for m in IFSC_RE.finditer(text):
-        bank_accounts.append(f"IFSC:{m.group(0).upper()}")
-    phishing_links = [_normalize_url(m.group(0)) for m in URL_RE.finditer(text)]
+    for code in signals.ifsc_codes:
+        bank_accounts.append(f"IFSC:{code}")
+    phishing_links = [_normalize_url(url) for url in signals.urls]
 
     return {
         "upi_ids": upi_ids,
@@ -76,3 +74,80 @@ def merge_intel(existing: Dict[str, List[str]], found: Dict[str, List[str]]) ->
 def extract_and_merge(text: str, existing: Dict[str, List[str]]) -> Dict[str, List[str]]:
     found = extract_intel(text)
     return merge_intel(existing, found)
+
+
+class IntelAccumulator:
+    FIELDS = ("upi_ids", "bank_accounts", "phishing_links")
+
+    def __init__(self, items: Dict[str, Dict[str, List[Any]]] | None = None) -> None:
+        # value -> [first-seen turn, source] per field; dict order is first-seen
+        # order. Loaded from a session, these are the session's own dicts, so new
+        # items land there directly and nothing already stored is rewritten
+        self._items = items if items is not None else {field: {} for field in self.FIELDS}
+        self._sorted: Dict[str, List[str]] | None = None
+        self.changed = False
+
+    @classmethod
+    def from_session(cls, session: Dict[str, Any]) -> "IntelAccumulator":
+        seen = session.get("intel_seen")
+        if not isinstance(seen, dict):
+            seen = session["intel_seen"] = {}
+        for field in cls.FIELDS:
+            if not isinstance(seen.get(field), dict):
+                seen[field] = {}
+        # Sessions written before first-seen tracking only have the plain lists;
+        # they are folded in once and dropped
+        legacy = session.pop("intel", None) or {}
+        for field in cls.FIELDS:
+            items = seen[field]
+            for value in legacy.get(field, []):
+                items.setdefault(value, [-1, "unknown"])
+        return cls(seen)
+
+    def add(self, found: Dict[str, List[str]], turn: int, source: str) -> int:
+        added = 0
+        for field in self.FIELDS:
+            items = self._items[field]
+            for value in found.get(field, []):
+                if value not in items:
+                    items[value] = [turn, source]
+                    added += 1
+        if added:
+            self._sorted = None
+            self.changed = True
+        return added
+
+    def extract(
+        self, text: str, turn: int, source: str, signals: MessageSignals | None = None
+    ) -> Dict[str, List[str]]:
+        found = extract_intel(text, signals)
+        self.add(found, turn, source)
+        return found
+
+    def first_seen(self, field: str, value: str) -> Tuple[int, str] | None:
+        entry = self._items.get(field, {}).get(value)
+        return (int(entry[0]), str(entry[1])) if entry is not None else None
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        if self._sorted is None:
+            self._sorted = {field: sorted(self._items[field]) for field in self.FIELDS}
+        return {field: list(values) for field, values in self._sorted.items()}
+
+    def to_session(self, session: Dict[str, Any]) -> None:
+        # Items were appended in place; only a standalone accumulator is attached here
+        if session.get("intel_seen") is not self._items:
+            session["intel_seen"] = self._items
+        session.pop("intel", None)
+        self.changed = False
+
+
+def extract_intel_batch(texts: Iterable[str]) -> List[Dict[str, List[str]]]:
+    cache: Dict[str, Dict[str, List[str]]] = {}
+    results = []
+    for text in texts:
+        key = text or ""
+        found = cache.get(key)
+        if found is None:
+            found = cache[key] = extract_intel(key)
+        results.append({field: list(values) for field, values in found.items()})
+    return results
@@ -0,0 +1,278 @@
+import heapq
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from .config import (
+    INTEL_INDEX_ENABLED,
+    INTEL_INDEX_MAX_KEYS,
+    INTEL_INDEX_TTL_SECONDS,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_URL,
+    USE_REDIS,
+)
+
+# Session intel fields plus the host of every phishing link
+INDEX_FIELDS = ("upi_ids", "bank_accounts", "phishing_links", "domains")
+
+
+def link_domain(url: str) -> str:
+    host = urlsplit(url if "://" in url else "http://" + url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def normalize_identifier(field: str, value: str) -> str:
+    value = value.strip()
+    if field == "upi_ids":
+        return value.lower()
+    if field == "bank_accounts":
+        return "".join(value.split()).replace("-", "").upper()
+    if field == "phishing_links":
+        if "://" not in value:
+            value = "http://" + value
+        parts = urlsplit(value)
+        rest = value[len(parts.scheme) + 3 + len(parts.netloc) :].rstrip("/.,)")
+        return f"{parts.scheme.lower()}://{parts.netloc.lower()}{rest}"
+    if field == "domains":
+        return link_domain(value.lower().rstrip("/.,)"))
+    raise ValueError(f"unknown intel field: {field}")
+
+
+def index_entries(found: Dict[str, List[str]]) -> List[Tuple[str, str]]:
+    # (field, normalized value) pairs for one message, without repeats
+    entries: Dict[Tuple[str, str], None] = {}
+    for field in ("upi_ids", "bank_accounts", "phishing_links"):
+        for value in found.get(field, []):
+            normalized = normalize_identifier(field, value)
+            if normalized:
+                entries[(field, normalized)] = None
+            if field == "phishing_links":
+                domain = link_domain(normalized)
+                if domain:
+                    entries[("domains", domain)] = None
+    return list(entries)
+
+
+class NullIntelIndex:
+    async def record(self, session_id: str, found: Dict[str, List[str]], now: float | None = None) -> None:
+        return None
+
+    async def lookup(self, field: str, value: str, limit: int = 100) -> Dict[str, Any]:
+        return {"field": field, "value": value, "sessions": 0, "hits": 0, "matches": []}
+
+    async def top(self, field: str, by: str = "sessions", limit: int = 20) -> List[Dict[str, Any]]:
+        return []
+
+
+class _Entry:
+    __slots__ = ("hits", "sessions")
+
+    def __init__(self) -> None:
+        self.hits = 0
+        # session_id -> [first_seen, last_seen, hits]
+        self.sessions: Dict[str, List[float]] = {}
+
+
+class InMemoryIntelIndex(NullIntelIndex):
+    def __init__(self, max_keys: int = 100000) -> None:
+        # Least recently seen identifiers are dropped once max_keys is reached
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+
+    async def record(self, session_id: str, found: Dict[str, List[str]], now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        for key in index_entries(found):
+            entry = self._entries.get(key)
+            if entry is None:
+                if self.max_keys > 0 and len(self._entries) >= self.max_keys:
+                    self._entries.popitem(last=False)
+                entry = self._entries[key] = _Entry()
+            else:
+                self._entries.move_to_end(key)
+            entry.hits += 1
+            seen = entry.sessions.get(session_id)
+            if seen is None:
+                entry.sessions[session_id] = [now, now, 1]
+            else:
+                seen[1] = now
+                seen[2] += 1
+
+    async def lookup(self, field: str, value: str, limit: int = 100) -> Dict[str, Any]:
+        value = normalize_identifier(field, value)
+        entry = self._entries.get((field, value))
+        if entry is None:
+            return await super().lookup(field, value, limit)
+        recent = heapq.nlargest(limit, entry.sessions.items(), key=lambda item: item[1][1])
+        return {
+            "field": field,
+            "value": value,
+            "sessions": len(entry.sessions),
+            "hits": entry.hits,
+            "matches": [
+                {"session_id": sid, "first_seen": first, "last_seen": last, "hits": int(hits)}
+                for sid, (first, last, hits) in recent
+            ],
+        }
+
+    async def top(self, field: str, by: str = "sessions", limit: int = 20) -> List[Dict[str, Any]]:
+        entries = ((value, entry) for (kind, value), entry in self._entries.items() if kind == field)
+        if by == "hits":
+            ranked = heapq.nlargest(limit, entries, key=lambda item: item[1].hits)
+        else:
+            ranked = heapq.nlargest(limit, entries, key=lambda item: len(item[1].sessions))
+        return [{"value": value, "sessions": len(entry.sessions), "hits": entry.hits} for value, entry in ranked]
+
+
+def top_key(field: str, part: str) -> str:
+    # One hash tag per field keeps a field's leaderboards in the same cluster slot
+    return f"intel:top:{{{field}}}:{part}"
+
+
+# One identifier: first-seen (hash), last-seen (sorted set) and hits (hash) by
+# session. Returns 1 when the session is new for that identifier. Every key
+# shares the identifier's hash tag, so the script is Redis Cluster safe.
+_RECORD_LUA = """
+local fresh = redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+redis.call('HINCRBY', KEYS[3], ARGV[1], 1)
+local ttl = tonumber(ARGV[3])
+if ttl > 0 then
+    for j = 1, 3 do
+        redis.call('EXPIRE', KEYS[j], ttl)
+    end
+end
+return fresh
+"""
+
+# One field's leaderboards: sessions, hits, and the last time each identifier
+# was recorded. Identifiers unseen for longer than the TTL have had their own
+# keys expire, so they are dropped from all three. ARGV after the first two is
+# (value, fresh) pairs; with none the script only prunes.
+_LEADERBOARD_LUA = """
+local now = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+for i = 3, #ARGV, 2 do
+    if ARGV[i + 1] == '1' then
+        redis.call('ZINCRBY', KEYS[1], 1, ARGV[i])
+    end
+    redis.call('ZINCRBY', KEYS[2], 1, ARGV[i])
+    redis.call('ZADD', KEYS[3], now, ARGV[i])
+end
+if ttl > 0 then
+    local stale = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', '(' .. (now - ttl), 'LIMIT', 0, 1000)
+    if #stale > 0 then
+        for j = 1, 3 do
+            redis.call('ZREM', KEYS[j], unpack(stale))
+        end
+    end
+end
+return #ARGV / 2 - 1
+"""
+
+
+class RedisIntelIndex(NullIntelIndex):
+    def __init__(
+        self, redis_url: str = "", ttl_seconds: int = 0, max_connections: int = 50, client: Any = None
+    ) -> None:
+        if client is None:
+            import redis.asyncio as aioredis
+
+            pool = aioredis.ConnectionPool.from_url(
+                redis_url, max_connections=max_connections, decode_responses=True
+            )
+            client = aioredis.Redis(connection_pool=pool)
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self._script = client.register_script(_RECORD_LUA)
+        self._leaderboard = client.register_script(_LEADERBOARD_LUA)
+
+    def _key(self, field: str, value: str, part: str) -> str:
+        # Hash tag keeps one identifier's keys in the same cluster slot
+        return f"intel:{{{field}:{value}}}:{part}"
+
+    def _leaderboard_keys(self, field: str) -> List[str]:
+        return [top_key(field, part) for part in ("sessions", "hits", "seen")]
+
+    async def record(self, session_id: str, found: Dict[str, List[str]], now: float | None = None) -> None:
+        entries = index_entries(found)
+        if not entries:
+            return
+        now = time.time() if now is None else now
+        try:
+            # One script call per identifier, then one per field, so no call
+            # spans cluster slots; each batch goes out in a single round trip
+            pipe = self.client.pipeline(transaction=False)
+            for field, value in entries:
+                keys = [self._key(field, value, part) for part in ("first", "last", "hits")]
+                await self._script(keys=keys, args=[session_id, now, self.ttl_seconds], client=pipe)
+            fresh = await pipe.execute()
+            by_field: Dict[str, List[Any]] = {}
+            for (field, value), is_new in zip(entries, fresh):
+                by_field.setdefault(field, []).extend((value, int(is_new)))
+            pipe = self.client.pipeline(transaction=False)
+            for field, pairs in by_field.items():
+                await self._leaderboard(
+                    keys=self._leaderboard_keys(field), args=[now, self.ttl_seconds, *pairs], client=pipe
+                )
+            await pipe.execute()
+        except Exception:
+            # The index is for analysts; an unreachable Redis must not fail the turn
+            return
+
+    async def lookup(self, field: str, value: str, limit: int = 100) -> Dict[str, Any]:
+        value = normalize_identifier(field, value)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrange(self._key(field, value, "last"), 0, max(0, limit - 1), withscores=True)
+        pipe.zcard(self._key(field, value, "last"))
+        pipe.zscore(top_key(field, "hits"), value)
+        recent, count, hits = await pipe.execute()
+        if not recent:
+            return await super().lookup(field, value, limit)
+        ids = [sid for sid, _ in recent]
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hmget(self._key(field, value, "first"), ids)
+        pipe.hmget(self._key(field, value, "hits"), ids)
+        firsts, counts = await pipe.execute()
+        return {
+            "field": field,
+            "value": value,
+            "sessions": int(count),
+            "hits": int(float(hits or 0)),
+            "matches": [
+                {
+                    "session_id": sid,
+                    "first_seen": float(first or last),
+                    "last_seen": float(last),
+                    "hits": int(session_hits or 0),
+                }
+                for (sid, last), first, session_hits in zip(recent, firsts, counts)
+            ],
+        }
+
+    async def top(self, field: str, by: str = "sessions", limit: int = 20) -> List[Dict[str, Any]]:
+        # Prune first so a field with no recent records does not rank expired identifiers
+        await self._leaderboard(keys=self._leaderboard_keys(field), args=[time.time(), self.ttl_seconds])
+        ranked = await self.client.zrevrange(top_key(field, by), 0, max(0, limit - 1), withscores=True)
+        if not ranked:
+            return []
+        other = "hits" if by == "sessions" else "sessions"
+        scores = await self.client.zmscore(top_key(field, other), [value for value, _ in ranked])
+        return [
+            {"value": value, by: int(score), other: int(extra or 0)}
+            for (value, score), extra in zip(ranked, scores)
+        ]
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def get_intel_index():
+    if not INTEL_INDEX_ENABLED:
+        return NullIntelIndex()
+    if USE_REDIS and REDIS_URL:
+        try:
+            return RedisIntelIndex(REDIS_URL, INTEL_INDEX_TTL_SECONDS, REDIS_MAX_CONNECTIONS)
+        except Exception:
+            return InMemoryIntelIndex(INTEL_INDEX_MAX_KEYS)
+    return InMemoryIntelIndex(INTEL_INDEX_MAX_KEYS)
@@ -1,23 +1,140 @@
-﻿import datetime
+﻿import atexit
 import json
 import logging
+import os
+import queue
+import random
 import sys
-from typing import Any, Dict
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, List
 
-from .config import LOG_LEVEL
+from .config import LOG_ASYNC, LOG_BATCH_SIZE, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_SAMPLE_RATES
+from .metrics import LOGS_DROPPED
+
+
+def _json_encoder() -> Callable[[Dict[str, Any]], bytes]:
+    try:
+        import orjson
+
+        return lambda payload: orjson.dumps(payload, default=str)
+    except ImportError:
+        return lambda payload: json.dumps(payload, ensure_ascii=True, default=str).encode("ascii")
+
+
+_encode = _json_encoder()
+
+
+def _timestamp(created: float) -> str:
+    seconds = int(created)
+    micros = int((created - seconds) * 1_000_000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds)) + f".{micros:06d}Z"
 
 
 class JsonFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:
+    def encode(self, record: logging.LogRecord) -> bytes:
         payload: Dict[str, Any] = {
-            "time": datetime.datetime.utcnow().isoformat() + "Z",
+            # Stamped when the event was logged, not when the listener got to it
+            "time": _timestamp(record.created),
             "level": record.levelname,
             "message": record.getMessage(),
         }
         extra = getattr(record, "extra", None)
         if isinstance(extra, dict):
             payload.update(extra)
-        return json.dumps(payload, ensure_ascii=True)
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return _encode(payload)
+
+    def format(self, record: logging.LogRecord) -> str:
+        return self.encode(record).decode("utf-8")
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    def __init__(self, stream=None, batch_size: int = 256) -> None:
+        super().__init__(stream)
+        self.batch_size = max(1, batch_size)
+        self._pending: List[bytes] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._pending.append(self.formatter.encode(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        # One write per batch instead of one per event
+        if not self._pending:
+            return
+        data = b"\n".join(self._pending) + b"\n"
+        self._pending = []
+        self.acquire()
+        try:
+            buffer = getattr(self.stream, "buffer", None)
+            if buffer is not None:
+                self.stream.flush()
+                buffer.write(data)
+                buffer.flush()
+            else:
+                self.stream.write(data.decode("utf-8"))
+                self.stream.flush()
+        except Exception:
+            pass
+        finally:
+            self.release()
+
+
+class SamplingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue, sample_rates: Dict[str, float] | None = None) -> None:
+        super().__init__(log_queue)
+        self.sample_rates = sample_rates or {}
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; the request path only enqueues
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGS_DROPPED.inc(reason="queue_full")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # High-volume info events can be sampled; warnings and errors always go through
+        rate = self.sample_rates.get(record.msg) if record.levelno <= logging.INFO else None
+        if rate is not None and random.random() >= rate:
+            LOGS_DROPPED.inc(reason="sampled")
+            return
+        self.enqueue(record)
+
+
+class BatchingQueueListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Block rather than fail if the queue is full at shutdown
+        self.queue.put(self._sentinel)
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        # Drain whatever is queued without blocking; flush the batch only once
+        # the queue runs dry so bursts turn into a few large writes
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get(block)
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        super().stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+_listener: BatchingQueueListener | None = None
 
 
 def get_logger() -> logging.Logger:
@@ -25,11 +142,39 @@ def get_logger() -> logging.Logger:
     if logger.handlers:
         return logger
     logger.setLevel(LOG_LEVEL)
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(JsonFormatter())
+    if not LOG_ASYNC:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        return logger
+
+    handler = SamplingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE), LOG_SAMPLE_RATES)
+    _start_listener(handler)
+    atexit.register(stop_logging)
+    # Threads do not survive fork, so a worker forked after import (e.g. gunicorn
+    # --preload) starts its own listener on a fresh queue
+    os.register_at_fork(after_in_child=lambda: _start_listener(handler))
     logger.addHandler(handler)
     return logger
 
 
+def _start_listener(handler: SamplingQueueHandler) -> None:
+    global _listener
+    handler.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    writer = BatchStreamHandler(sys.stdout, LOG_BATCH_SIZE)
+    writer.setFormatter(JsonFormatter())
+    _listener = BatchingQueueListener(handler.queue, writer)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    # Drains the queue and flushes the last batch; safe to call more than once
+    if _listener is not None:
+        _listener.stop()
+
+
 def log_event(logger: logging.Logger, event: str, **fields: Any) -> None:
-    logger.info(event, extra={"extra": fields})
+    # Builds the record directly: logger.info() would walk the stack for the caller's
+    # file and line, which costs more than the rest of the call and is never logged
+    if logger.isEnabledFor(logging.INFO):
+        logger.handle(logger.makeRecord(logger.name, logging.INFO, "", 0, event, None, None, extra={"extra": fields}))
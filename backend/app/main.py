@@ -1,18 +1,31 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 
-from .config import CORS_ORIGINS
+from .backends import close_backends, open_backends, update_stats_gauges
+from .config import CORS_ORIGINS, METRICS_ENABLED
+from .metrics import CONTENT_TYPE, REGISTRY
 from .routes import router
 
 # Load environment variables from .env if present
 load_dotenv()
 
-app = FastAPI(title="Agentic Honey-Pot Scam Detection API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Session store, rate limiters, agent and the LLM connection pool are built here,
+    # inside each worker process, and torn down on shutdown
+    await open_backends()
+    yield
+    await close_backends()
+
+
+app = FastAPI(title="Agentic Honey-Pot Scam Detection API", lifespan=lifespan)
 app.include_router(router)
 
 # CORS for local UI + demo use
@@ -43,6 +56,14 @@ def health():
     return {"status": "ok"}
 
 
+if METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        update_stats_gauges()
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/styles.css")
 def serve_styles():
     path = frontend_dir / "styles.css"
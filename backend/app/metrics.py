@@ -0,0 +1,243 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; fine-grained at the low end where regex and in-memory store work lands
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.family = f"{name}_total"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.family}{_labels(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.family = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.family}{_labels(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.family = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        lines: List[str] = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[Counter | Gauge | Histogram] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.family} {metric.documentation}")
+            lines.append(f"# TYPE {metric.family} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram("honeypot_request_seconds", "Time to handle a message request.", ["endpoint"])
+)
+STAGE_SECONDS = REGISTRY.register(
+    Histogram("honeypot_stage_seconds", "Time spent in each stage of a message turn.", ["stage"])
+)
+AGENT_REPLY_SECONDS = REGISTRY.register(
+    Histogram(
+        "honeypot_agent_reply_seconds",
+        "Time to produce an agent reply, by LLM provider and how the reply was produced.",
+        ["provider", "outcome"],
+    )
+)
+SCAM_DETECTIONS = REGISTRY.register(
+    Counter("honeypot_scam_detections", "Messages flagged as scams.")
+)
+LLM_FALLBACKS = REGISTRY.register(
+    Counter("honeypot_llm_fallbacks", "LLM calls that failed and fell back to the rule-based reply.", ["provider"])
+)
+LLM_REJECTED = REGISTRY.register(
+    Counter(
+        "honeypot_llm_rejected",
+        "LLM calls not attempted or abandoned (circuit_open, saturated, budget).",
+        ["provider", "reason"],
+    )
+)
+LLM_PROVIDER_SECONDS = REGISTRY.register(
+    Histogram("honeypot_llm_provider_seconds", "Latency of routed LLM calls per provider.", ["provider", "outcome"])
+)
+LLM_HEDGED = REGISTRY.register(
+    Counter("honeypot_llm_hedged", "Hedged requests sent to a second provider, by that provider.", ["provider"])
+)
+LLM_COALESCED = REGISTRY.register(
+    Counter("honeypot_llm_coalesced", "LLM calls served by an identical request already in flight.", ["provider"])
+)
+REPLY_CACHE_LOOKUPS = REGISTRY.register(
+    Counter("honeypot_reply_cache_lookups", "Reply cache lookups by result.", ["result"])
+)
+CAMPAIGN_LOOKUPS = REGISTRY.register(
+    Counter("honeypot_campaign_lookups", "Campaign index lookups by result.", ["result"])
+)
+KNOWN_BAD_HITS = REGISTRY.register(
+    Counter("honeypot_known_bad_hits", "Blocklisted identifiers seen in messages.", ["field"])
+)
+RATE_LIMITED = REGISTRY.register(
+    Counter("honeypot_rate_limited", "Requests rejected by the rate limiter.", ["scope"])
+)
+EVIDENCE_QUEUE_DEPTH = REGISTRY.register(
+    Gauge("honeypot_evidence_queue_depth", "Evidence records waiting to be written, after the last commit.")
+)
+EVIDENCE_DROPPED = REGISTRY.register(
+    Counter("honeypot_evidence_dropped", "Evidence records not written, by reason (queue_full or error).", ["reason"])
+)
+EVIDENCE_COMMIT_SECONDS = REGISTRY.register(
+    Histogram("honeypot_evidence_commit_seconds", "Time to write and commit one batch of evidence records.")
+)
+EVIDENCE_BATCH_RECORDS = REGISTRY.register(
+    Histogram(
+        "honeypot_evidence_batch_records",
+        "Evidence records per group commit.",
+        buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+    )
+)
+SESSION_STORE_SESSIONS = REGISTRY.register(
+    Gauge("honeypot_session_store_sessions", "Sessions held by the in-memory session store.")
+)
+SESSION_STORE_BYTES = REGISTRY.register(
+    Gauge("honeypot_session_store_bytes", "JSON size of the sessions held by the in-memory session store.")
+)
+SESSION_STORE_REMOVED = REGISTRY.register(
+    Gauge(
+        "honeypot_session_store_removed",
+        "Sessions dropped by the in-memory store since start, by reason (evicted or expired).",
+        ["reason"],
+    )
+)
+REPLY_CACHE_ENTRIES = REGISTRY.register(
+    Gauge("honeypot_reply_cache_entries", "Replies held in the in-process reply cache.")
+)
+LOGS_DROPPED = REGISTRY.register(
+    Counter("honeypot_logs_dropped", "Log events not written, by reason (queue_full or sampled).", ["reason"])
+)
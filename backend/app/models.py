@@ -1,4 +1,6 @@
-﻿from pydantic import BaseModel, Field
+﻿from typing import Literal
+
+from pydantic import BaseModel, Field
 
 
 class MessageRequest(BaseModel):
@@ -8,6 +10,17 @@ class MessageRequest(BaseModel):
     persona: str | None = None
 
 
+class BatchMessageItem(BaseModel):
+    session_id: str = Field(..., min_length=1)
+    message: str = Field(..., min_length=1)
+    persona: str | None = None
+
+
+class BatchMessageRequest(BaseModel):
+    api_key: str = Field(..., min_length=1)
+    messages: list[BatchMessageItem] = Field(..., min_length=1, max_length=10000)
+
+
 class ExtractedIntel(BaseModel):
     upi_ids: list[str] = Field(default_factory=list)
     bank_accounts: list[str] = Field(default_factory=list)
@@ -27,3 +40,54 @@ class MessageResponse(BaseModel):
     scam_intent: str | None = None
     scam_reasons: list[str] | None = None
     scam_score: int | None = None
+    campaign_id: str | None = None
+
+
+class BatchMessageResponse(BaseModel):
+    results: list[MessageResponse]
+
+
+IntelField = Literal["upi_ids", "bank_accounts", "phishing_links", "domains"]
+
+
+class IntelMatch(BaseModel):
+    session_id: str
+    first_seen: float
+    last_seen: float
+    hits: int
+
+
+class IntelLookupResponse(BaseModel):
+    field: IntelField
+    value: str
+    sessions: int
+    hits: int
+    matches: list[IntelMatch]
+
+
+class IntelTopItem(BaseModel):
+    value: str
+    sessions: int
+    hits: int
+
+
+class IntelTopResponse(BaseModel):
+    field: IntelField
+    by: Literal["sessions", "hits"]
+    results: list[IntelTopItem]
+
+
+class Campaign(BaseModel):
+    campaign_id: str
+    messages: int
+    sessions: int
+    first_seen: float
+    last_seen: float
+    scam_detected: bool
+    score: int
+    intent: str
+    sample: str
+
+
+class CampaignsResponse(BaseModel):
+    campaigns: list[Campaign]
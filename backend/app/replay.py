@@ -0,0 +1,263 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, Dict, Iterable, Iterator, List, Tuple
+
+from .agent import HoneyPotAgent, MockLLMClient
+from .models import MessageResponse
+from .scam_detector import classifier_scores
+from .session_store import INTEL_FIELDS, new_session
+from .signals import MessageSignals
+from .turns import agent_inputs, begin_turn, finish_turn, prepare_session, scan_message
+
+# Accepted column names, in order of preference
+ID_FIELDS = ("session_id", "conversation_id", "request_id", "id")
+TEXT_FIELDS = ("message", "text", "body", "content")
+CSV_COLUMNS = [
+    "line",
+    "session_id",
+    "scam_detected",
+    "scam_score",
+    "scam_intent",
+    "scam_reasons",
+    "risk_score",
+    "agent_active",
+    "agent_reply",
+    "campaign_id",
+    *INTEL_FIELDS,
+]
+
+Record = Tuple[int, str, str, str | None]
+Scan = Tuple[MessageSignals, Dict[str, object]]
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _format(path: str, explicit: str | None) -> str:
+    if explicit:
+        return explicit
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "jsonl"
+
+
+def _pick(row: Dict[str, Any], preferred: str | None, fallbacks: Iterable[str]) -> Any:
+    if preferred:
+        return row.get(preferred)
+    for name in fallbacks:
+        value = row.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def read_records(
+    path: str,
+    fmt: str | None = None,
+    id_field: str | None = None,
+    text_field: str | None = None,
+    skipped: List[int] | None = None,
+) -> Iterator[Record]:
+    # One row at a time, so memory does not grow with the size of the archive
+    fmt = _format(path, fmt)
+    handle = _open(path, "r")
+    try:
+        rows: Iterable[Dict[str, Any]]
+        if fmt == "csv":
+            rows = csv.DictReader(handle)
+        else:
+            rows = (json.loads(line) for line in handle if line.strip())
+        for line, row in enumerate(rows, start=1):
+            text = _pick(row, text_field, TEXT_FIELDS)
+            if not isinstance(text, str) or not text.strip():
+                if skipped is not None:
+                    skipped.append(line)
+                continue
+            session_id = _pick(row, id_field, ID_FIELDS)
+            yield line, str(session_id if session_id is not None else f"line-{line}"), text, row.get("persona")
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def scan_batch(messages: List[str]) -> List[Scan]:
+    # Runs in the worker processes: the stateless, regex-heavy part of a turn
+    distinct = list(dict.fromkeys(messages))
+    scores = classifier_scores(distinct)
+    scans = {message: scan_message(message, scores[i] if scores else None) for i, message in enumerate(distinct)}
+    for signals, _ in scans.values():
+        # The parent still has the text; no need to ship it back twice
+        signals.text = signals.lower = ""
+    return [scans[message] for message in messages]
+
+
+def _batches(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    batch: List[Record] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def scanned(records: Iterable[Record], workers: int, batch_size: int) -> Iterator[Tuple[Record, Scan]]:
+    # Results come back in input order. At most two batches per worker are in
+    # flight, so a fast reader cannot queue up the whole archive in memory.
+    if workers <= 0:
+        for batch in _batches(records, batch_size):
+            yield from zip(batch, scan_batch([r[2] for r in batch]))
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending: deque = deque()
+        for batch in _batches(records, batch_size):
+            pending.append((batch, pool.submit(scan_batch, [r[2] for r in batch])))
+            if len(pending) >= workers * 2:
+                done, future = pending.popleft()
+                yield from zip(done, future.result())
+        while pending:
+            done, future = pending.popleft()
+            yield from zip(done, future.result())
+
+
+class Replayer:
+    def __init__(self, history_window: int = 20, max_sessions: int = 100000) -> None:
+        # Rule-based agent only: replays must be fast, free and reproducible
+        self.agent = HoneyPotAgent(MockLLMClient())
+        self.history_window = history_window
+        # Least recently seen conversations are closed once this many are open;
+        # archives are usually grouped by conversation, so this rarely splits one
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.conversations = 0
+        self.scam_conversations = 0
+        self.messages = 0
+        self.scam_messages = 0
+        # value -> [conversations it appeared in, first conversation]
+        self.intel: Dict[str, Dict[str, List[Any]]] = {field: {} for field in INTEL_FIELDS}
+
+    def turn(self, session_id: str, message: str, persona: str | None, scan: Scan) -> MessageResponse:
+        session = self.sessions.get(session_id)
+        if session is None:
+            if self.max_sessions > 0 and len(self.sessions) >= self.max_sessions:
+                self._close(self.sessions.popitem(last=False)[1])
+            session = self.sessions[session_id] = prepare_session(new_session())
+            self.conversations += 1
+        else:
+            self.sessions.move_to_end(session_id)
+        known = {field: len(session["intel_seen"].get(field) or ()) for field in INTEL_FIELDS}
+
+        signals, _ = scan
+        signals.text, signals.lower = message, message.lower()
+        turn = begin_turn(session, message, persona, scan)
+        if session.get("agent_active", False):
+            reply = self.agent.reply(session["history"], turn.persona, **agent_inputs(session, turn.intel, turn.persona))
+        else:
+            reply = self.agent.normal_reply(turn.persona, message)
+        response = finish_turn(session_id, session, turn, reply)
+
+        # Same trimming the session store applies, so long conversations stay small
+        history = session["history"]
+        if self.history_window > 0 and len(history) > self.history_window:
+            drop = len(history) - self.history_window
+            del history[:drop]
+            session["history_dropped"] = int(session.get("history_dropped") or 0) + drop
+
+        self.messages += 1
+        self.scam_messages += int(bool(turn.details.get("scam_detected")))
+        for field in INTEL_FIELDS:
+            # intel_seen only appends, so whatever lies past the old length is new
+            for value in list(session["intel_seen"].get(field) or ())[known[field] :]:
+                entry = self.intel[field].setdefault(value, [0, session_id])
+                entry[0] += 1
+        return response
+
+    def _close(self, session: Dict[str, Any]) -> None:
+        self.scam_conversations += int(bool(session.get("scam_detected")))
+
+    def summary(self) -> Dict[str, Any]:
+        open_scams = sum(1 for s in self.sessions.values() if s.get("scam_detected"))
+        return {
+            "messages": self.messages,
+            "conversations": self.conversations,
+            "scam_messages": self.scam_messages,
+            "scam_conversations": self.scam_conversations + open_scams,
+            "intel": {
+                field: [
+                    {"value": value, "conversations": count, "first_conversation": first}
+                    for value, (count, first) in sorted(values.items(), key=lambda item: (-item[1][0], item[0]))
+                ]
+                for field, values in self.intel.items()
+            },
+        }
+
+
+def _row(line: int, response: MessageResponse) -> Dict[str, Any]:
+    row = response.model_dump(exclude={"persona_profile", "asked_fields", "extracted_intel"})
+    row["line"] = line
+    row.update(response.extracted_intel.model_dump())
+    return row
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a conversation archive through detection, extraction and the rule-based agent")
+    parser.add_argument("input", help="JSONL or CSV archive (optionally .gz); - for stdin")
+    parser.add_argument("--output", "-o", default="-", help="per-message results, JSONL or CSV by extension (default stdout)")
+    parser.add_argument("--intel", help="write the run summary and aggregated intel as JSON here")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"])
+    parser.add_argument("--output-format", choices=["jsonl", "csv"])
+    parser.add_argument("--id-field", help="column holding the conversation id")
+    parser.add_argument("--text-field", help="column holding the message text")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scanning processes; 0 scans in-process")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--history-window", type=int, default=20)
+    parser.add_argument("--max-sessions", type=int, default=100000, help="open conversations kept in memory")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    skipped: List[int] = []
+    records = read_records(args.input, args.input_format, args.id_field, args.text_field, skipped)
+    replayer = Replayer(args.history_window, args.max_sessions)
+    out_format = args.output_format or (_format(args.output, None) if args.output != "-" else "jsonl")
+    out = _open(args.output, "w")
+    try:
+        writer = csv.DictWriter(out, CSV_COLUMNS, extrasaction="ignore") if out_format == "csv" else None
+        if writer is not None:
+            writer.writeheader()
+        for (line, session_id, message, persona), scan in scanned(records, args.workers, max(1, args.batch_size)):
+            row = _row(line, replayer.turn(session_id, message, persona, scan))
+            if writer is not None:
+                writer.writerow({k: ";".join(v) if isinstance(v, list) else v for k, v in row.items()})
+            else:
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        else:
+            out.flush()
+
+    summary = replayer.summary()
+    summary["skipped_lines"] = len(skipped)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    if args.intel:
+        with open(args.intel, "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2, ensure_ascii=False)
+    stats = {k: v for k, v in summary.items() if k != "intel"}
+    print(json.dumps(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,33 @@
-﻿from fastapi import APIRouter, HTTPException, Request
+﻿from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
-import re
+import asyncio
+import json
+import math
+import time
+from typing import Any, AsyncIterator, Dict, List, Literal, Tuple
 
-from .agent import HoneyPotAgent, get_llm_client, get_profile
-from .intel_extractor import extract_and_merge
+from .backends import get_backends
+from .campaigns import get_campaign_index
 from .logger import get_logger, log_event
-from .models import MessageRequest, MessageResponse, ExtractedIntel
-from .scam_detector import detect_scam, detect_scam_details
-from .session_store import get_rate_limiter, get_session_store, new_session
-from .config import API_KEY, PERSONA_DEFAULT
+from .metrics import RATE_LIMITED, REQUEST_SECONDS, STAGE_SECONDS
+from .models import (
+    BatchMessageRequest,
+    BatchMessageResponse,
+    CampaignsResponse,
+    IntelField,
+    IntelLookupResponse,
+    IntelTopResponse,
+    MessageRequest,
+    MessageResponse,
+)
+from .scam_detector import classifier_scores
+from .signals import MessageSignals
+from .turns import Turn, agent_inputs, begin_turn, finish_turn, prepare_session, scan_message
+from .config import API_KEY
 
 router = APIRouter()
 logger = get_logger()
-store = get_session_store()
-rate_limiter = get_rate_limiter()
-agent = HoneyPotAgent(get_llm_client())
 
 
 def _validate_api_key(api_key: str) -> None:
@@ -22,117 +35,238 @@ def _validate_api_key(api_key: str) -> None:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 
+async def _enforce_rate_limit(request: Request, session_costs: Dict[str, int]) -> None:
+    # Flood bots are cut off per client IP first, then per honeypot session; every
+    # message costs a token, so a batch is charged as much as sending it one by one
+    client = request.client.host if request.client else "unknown"
+    backends = get_backends()
+    # A bucket never holds more than a minute's worth of tokens, so a larger
+    # batch could never pass; reject it outright instead of a 429 that cannot clear
+    limits = (
+        ("RATE_LIMIT_IP_PER_MIN", backends.ip_rate_limiter.per_minute, sum(session_costs.values())),
+        ("RATE_LIMIT_PER_MIN", backends.rate_limiter.per_minute, max(session_costs.values(), default=0)),
+    )
+    for name, per_minute, cost in limits:
+        if 0 < per_minute < cost:
+            RATE_LIMITED.inc(scope="oversized")
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch needs {cost} messages of rate limit but {name} is {per_minute}; split it",
+            )
+    wait = await backends.ip_rate_limiter.acquire(f"ip:{client}", sum(session_costs.values()))
+    scope = "ip"
+    if not wait:
+        waits = await asyncio.gather(
+            *(backends.rate_limiter.acquire(f"session:{sid}", cost) for sid, cost in session_costs.items())
+        )
+        wait = max(waits, default=0.0)
+        scope = "session"
+    if wait > 0:
+        RATE_LIMITED.inc(scope=scope)
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+async def _process_turn(
+    session_id: str,
+    session: Dict[str, Any],
+    message: str,
+    persona: str | None,
+    scan: Tuple[MessageSignals, Dict[str, object]] | None = None,
+) -> MessageResponse:
+    turn = begin_turn(session, message, persona, scan)
+    agent = get_backends().agent
+    with STAGE_SECONDS.time(stage="agent_reply"):
+        if session.get("agent_active", False):
+            inputs = agent_inputs(session, turn.intel, turn.persona)
+            agent_reply = await agent.areply(session["history"], turn.persona, **inputs)
+        else:
+            # Normal conversation reply when not a scam
+            agent_reply = await agent.anormal_reply(turn.persona, message)
+    response = finish_turn(session_id, session, turn, agent_reply)
+    _record_evidence(session_id, message, agent_reply, turn)
+    await _index_intel(session_id, turn.found)
+    return response
+
+
+def _record_evidence(session_id: str, message: str, reply: str, turn: Turn) -> None:
+    # Queued for the evidence store's writer thread; never waits on disk
+    evidence = get_backends().evidence
+    if evidence is not None:
+        evidence.record(session_id, turn.index, turn.persona, message, reply, turn.details, turn.found)
+
+
+async def _index_intel(session_id: str, found: Dict[str, List[str]]) -> None:
+    # Reverse index for analysts: identifier -> sessions, updated as intel arrives
+    if any(found.values()):
+        with STAGE_SECONDS.time(stage="intel_index"):
+            await get_backends().intel_index.record(session_id, found)
+
+
 @router.post("/message", response_model=MessageResponse)
 async def handle_message(payload: MessageRequest, request: Request) -> MessageResponse:
+    start = time.perf_counter()
     _validate_api_key(payload.api_key)
+    await _enforce_rate_limit(request, {payload.session_id: 1})
 
-    if not rate_limiter.allow(payload.session_id):
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
-
-    session = store.get_session(payload.session_id) or new_session()
-    session.setdefault("history", [])
-    session.setdefault("intel", {"upi_ids": [], "bank_accounts": [], "phishing_links": []})
-    session.setdefault("scam_detected", False)
-    session.setdefault("agent_active", False)
-    session.setdefault("persona", PERSONA_DEFAULT)
-    session.setdefault("persona_profile", {})
-    session.setdefault("asked_fields", [])
-
-    session["history"].append({"role": "user", "content": payload.message})
-
-    details = detect_scam_details(payload.message)
-    # Determine persona early so UI always reflects selection
-    persona = (payload.persona or session.get("persona") or PERSONA_DEFAULT).lower()
-    session["persona"] = persona
-    session["persona_profile"] = get_profile(persona, session.get("persona_profile") or {})
-
-    scam_detected = session.get("scam_detected", False) or bool(details.get("scam_detected"))
-    session["scam_detected"] = scam_detected
-    # Activate agent if strong signals or moderate score with unknown intent
-    score = int(details.get("score") or 0) if details else 0
-    intent = str(details.get("intent") or "unknown") if details else "unknown"
-    if scam_detected or (score >= 25 and intent == "unknown"):
-        session["agent_active"] = True
-
-    agent_active = session.get("agent_active", False)
-    agent_reply = ""
-    if agent_active:
-        profile = session.get("persona_profile") or get_profile(persona, {})
-
-        intel_seed = extract_and_merge(payload.message, session.get("intel", {}))
-        asked = session.get("asked_fields", [])
-        agent_reply = agent.reply(session["history"], persona, intel_seed, asked, profile)
-        session["history"].append({"role": "assistant", "content": agent_reply})
-    else:
-        # Normal conversation reply when not a scam
-        agent_reply = agent.normal_reply(persona, payload.message)
-        session["history"].append({"role": "assistant", "content": agent_reply})
-
-    intel = session.get("intel", {"upi_ids": [], "bank_accounts": [], "phishing_links": []})
-    intel = extract_and_merge(payload.message, intel)
-    if agent_reply:
-        intel = extract_and_merge(agent_reply, intel)
-    session["intel"] = intel
-
-    # Update asked fields based on reply content
-    asked_fields = set(session.get("asked_fields", []))
-    reply_text = (agent_reply or "").lower()
-    if "upi" in reply_text:
-        asked_fields.add("upi")
-    if "account" in reply_text or "ifsc" in reply_text:
-        asked_fields.add("bank_ifsc")
-    if "link" in reply_text or "url" in reply_text:
-        asked_fields.add("link")
-    if "wallet" in reply_text or "crypto" in reply_text or "bitcoin" in reply_text:
-        asked_fields.add("crypto_wallet")
-    session["asked_fields"] = sorted(asked_fields)
-
-    # Risk score based on signals (0-95)
-    combined = (payload.message + " " + agent_reply).strip()
-    email_re = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.IGNORECASE)
-    phone_re = re.compile(r"\+?\d[\d\s().-]{7,}\d")
-    crypto_re = re.compile(r"\b(bc1|[13])[a-zA-HJ-NP-Z0-9]{25,39}\b", re.IGNORECASE)
-    has_email = bool(email_re.search(combined))
-    has_phone = bool(phone_re.search(combined))
-    has_crypto = bool(crypto_re.search(combined))
-
-    risk_score = 0
-    if scam_detected:
-        risk_score += 40
-    if intel.get("phishing_links"):
-        risk_score += 25
-    if intel.get("upi_ids") or intel.get("bank_accounts"):
-        risk_score += 20
-    if has_phone:
-        risk_score += 5
-    if has_email:
-        risk_score += 5
-    if has_crypto:
-        risk_score += 10
-    risk_score = min(risk_score, 95)
-
-    store.save_session(payload.session_id, session)
+    async with get_backends().store.session(payload.session_id) as session:
+        prepare_session(session)
+        response = await _process_turn(payload.session_id, session, payload.message, payload.persona)
 
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, endpoint="message")
     log_event(
         logger,
         "message_handled",
         session_id=payload.session_id,
-        scam_detected=scam_detected,
-        agent_active=agent_active,
+        scam_detected=response.scam_detected,
+        agent_active=response.agent_active,
+        duration_ms=round(elapsed * 1000, 2),
         client=request.client.host if request.client else "unknown",
     )
 
-    return MessageResponse(
-        session_id=payload.session_id,
-        scam_detected=scam_detected,
-        agent_active=agent_active,
-        extracted_intel=ExtractedIntel(**intel),
-        agent_reply=agent_reply,
-        risk_score=risk_score,
-        persona=session.get("persona"),
-        persona_profile=session.get("persona_profile"),
-        asked_fields=session.get("asked_fields"),
-        scam_intent=str(details.get("intent")) if details else None,
-        scam_reasons=list(details.get("reasons")) if details else None,
-        scam_score=int(details.get("score")) if details and details.get("score") is not None else None,
+    return response
+
+
+@router.post("/message/batch", response_model=BatchMessageResponse)
+async def handle_message_batch(payload: BatchMessageRequest, request: Request) -> BatchMessageResponse:
+    start = time.perf_counter()
+    _validate_api_key(payload.api_key)
+
+    # Group by session so each session is loaded and saved once; turns within a
+    # session keep their submission order.
+    by_session: Dict[str, List[int]] = {}
+    for index, item in enumerate(payload.messages):
+        by_session.setdefault(item.session_id, []).append(index)
+
+    await _enforce_rate_limit(request, {sid: len(indexes) for sid, indexes in by_session.items()})
+
+    # Bulk exports repeat broadcast texts, so each distinct message is scanned once
+    distinct = list(dict.fromkeys(item.message for item in payload.messages))
+    ml_scores = classifier_scores(distinct)
+    scans = {message: scan_message(message, ml_scores[i] if ml_scores else None) for i, message in enumerate(distinct)}
+    results: List[MessageResponse | None] = [None] * len(payload.messages)
+
+    async def run_session(session_id: str, indexes: List[int]) -> None:
+        async with get_backends().store.session(session_id) as session:
+            prepare_session(session)
+            for index in indexes:
+                item = payload.messages[index]
+                scan = scans[item.message]
+                results[index] = await _process_turn(session_id, session, item.message, item.persona, scan)
+
+    # Sessions are independent, so their LLM calls can overlap
+    await asyncio.gather(*(run_session(session_id, indexes) for session_id, indexes in by_session.items()))
+
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, endpoint="batch")
+    log_event(
+        logger,
+        "batch_handled",
+        messages=len(payload.messages),
+        sessions=len(by_session),
+        scam_detected=sum(1 for r in results if r and r.scam_detected),
+        duration_ms=round(elapsed * 1000, 2),
+        client=request.client.host if request.client else "unknown",
+    )
+
+    return BatchMessageResponse(results=results)
+
+
+@router.get("/intel/lookup", response_model=IntelLookupResponse)
+async def intel_lookup(
+    field: IntelField,
+    value: str = Query(..., min_length=1),
+    api_key: str = "",
+    limit: int = Query(100, ge=1, le=1000),
+) -> IntelLookupResponse:
+    _validate_api_key(api_key)
+    start = time.perf_counter()
+    result = await get_backends().intel_index.lookup(field, value, limit)
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="intel_lookup")
+    return IntelLookupResponse(**result)
+
+
+@router.get("/intel/top", response_model=IntelTopResponse)
+async def intel_top(
+    field: IntelField,
+    api_key: str = "",
+    by: Literal["sessions", "hits"] = "sessions",
+    limit: int = Query(20, ge=1, le=1000),
+) -> IntelTopResponse:
+    _validate_api_key(api_key)
+    start = time.perf_counter()
+    results = await get_backends().intel_index.top(field, by, limit)
+    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint="intel_top")
+    return IntelTopResponse(field=field, by=by, results=results)
+
+
+@router.get("/campaigns", response_model=CampaignsResponse)
+async def list_campaigns(
+    api_key: str = "",
+    limit: int = Query(20, ge=1, le=1000),
+    min_messages: int = Query(2, ge=1),
+) -> CampaignsResponse:
+    # Campaigns are clustered per worker process
+    _validate_api_key(api_key)
+    index = get_campaign_index()
+    return CampaignsResponse(campaigns=index.top(limit, min_messages) if index is not None else [])
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/message/stream")
+async def handle_message_stream(payload: MessageRequest, request: Request) -> StreamingResponse:
+    start = time.perf_counter()
+    _validate_api_key(payload.api_key)
+    await _enforce_rate_limit(request, {payload.session_id: 1})
+
+    async def events() -> AsyncIterator[str]:
+        # The session stays locked for the whole stream so turns cannot interleave
+        backends = get_backends()
+        async with backends.store.session(payload.session_id) as session:
+            prepare_session(session)
+            turn = begin_turn(session, payload.message, payload.persona)
+            chunks: List[str] = []
+            if session.get("agent_active", False):
+                inputs = agent_inputs(session, turn.intel, turn.persona)
+                async for chunk in backends.agent.astream_reply(session["history"], turn.persona, **inputs):
+                    chunks.append(chunk)
+                    yield _sse("token", {"text": chunk})
+            else:
+                # Normal conversation reply when not a scam
+                with STAGE_SECONDS.time(stage="agent_reply"):
+                    chunk = await backends.agent.anormal_reply(turn.persona, payload.message)
+                chunks.append(chunk)
+                yield _sse("token", {"text": chunk})
+
+            # Intel extraction and the session save happen once the reply is complete
+            reply = "".join(chunks).strip()
+            response = finish_turn(payload.session_id, session, turn, reply)
+            _record_evidence(payload.session_id, payload.message, reply, turn)
+            await _index_intel(payload.session_id, turn.found)
+
+        elapsed = time.perf_counter() - start
+        REQUEST_SECONDS.observe(elapsed, endpoint="stream")
+        log_event(
+            logger,
+            "message_handled",
+            session_id=payload.session_id,
+            scam_detected=response.scam_detected,
+            agent_active=response.agent_active,
+            streamed=True,
+            duration_ms=round(elapsed * 1000, 2),
+            client=request.client.host if request.client else "unknown",
+        )
+        yield _sse("done", response.model_dump())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -1,5 +1,7 @@
-import re
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+from .config import SCAM_ML_VETO, SCAM_ML_VETO_MAX_SCORE, SCAM_MODEL_PATH
+from .signals import KeywordMatcher, MessageSignals, detector_signals, extract_signals
 
 SCAM_KEYWORDS = {
     "upi",
@@ -86,75 +88,140 @@ NORMAL_HINTS = {
     "call me",
 }
 
-URL_RE = re.compile(r"\b(?:https?://|www\.)[^\s<>\"]+\b", re.IGNORECASE)
-PHONE_RE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
-EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.IGNORECASE)
+# Keywords that only feed the fast-path triggers in detect_scam_details
+TRIGGER_KEYWORDS = {"upi", "otp", "ifsc", "bank account", "bitcoin", "crypto", "wallet"}
+URL_TRIGGER_KEYWORDS = {"verify", "login", "update", "kyc"}
+
+# Keyword hits that switch on a scoring category
+KEYWORD_CATEGORIES: Dict[str, Set[str]] = {
+    "urgency": URGENCY,
+    "credential_request": {"otp", "password", "login"},
+    "verification": {"kyc", "verify", "verification"},
+    "too_good": {"refund", "prize", "lottery"},
+    "crypto": {"bitcoin", "crypto", "wallet"},
+    "fee_request": {"processing fee"},
+}
 
+# Points per category, in the order reasons are reported
+SCORE_TABLE: List[Tuple[str, int]] = [
+    ("urgency", 15),
+    ("url", 20),
+    ("credential_request", 20),
+    ("verification", 15),
+    ("too_good", 15),
+    ("crypto", 20),
+    ("fee_request", 15),
+    ("contact_info", 5),
+]
 
-def _score(message: str) -> Tuple[int, List[str]]:
+
+KEYWORD_MATCHER = KeywordMatcher(
+    SCAM_KEYWORDS
+    | URGENCY
+    | FAMILY_HINTS
+    | NORMAL_HINTS
+    | TRIGGER_KEYWORDS
+    | URL_TRIGGER_KEYWORDS
+    | {"fee", "refund"}
+)
+
+
+def find_keywords(text: str) -> Dict[str, None]:
+    return KEYWORD_MATCHER.find(text)
+
+
+def message_signals(message: str) -> MessageSignals:
+    # One scan of the message shared by detection, intel extraction and risk scoring
+    return extract_signals(message, KEYWORD_MATCHER)
+
+
+def _categories(signals: MessageSignals) -> Set[str]:
+    hits = signals.keywords
+    found = {name for name, words in KEYWORD_CATEGORIES.items() if not words.isdisjoint(hits)}
+    if "fee" in hits and "refund" in hits:
+        found.add("fee_request")
+    if signals.urls:
+        found.add("url")
+    if signals.has_contact:
+        found.add("contact_info")
+    return found
+
+
+def _score_signals(signals: MessageSignals) -> Tuple[int, List[str]]:
     reasons: List[str] = []
-    if not message:
+    if not signals.text:
         return 0, reasons
 
-    text = message.lower()
     score = 0
-
-    keyword_hits = [kw for kw in SCAM_KEYWORDS if kw in text]
+    keyword_hits = [kw for kw in signals.keywords if kw in SCAM_KEYWORDS]
     if keyword_hits:
         score += min(30, 5 * len(keyword_hits))
         reasons.append(f"keywords:{','.join(keyword_hits[:5])}")
 
-    if any(u in text for u in URGENCY):
-        score += 15
-        reasons.append("urgency")
+    found = _categories(signals)
+    for reason, points in SCORE_TABLE:
+        if reason in found:
+            score += points
+            reasons.append(reason)
 
-    if URL_RE.search(text):
-        score += 20
-        reasons.append("url")
+    return score, reasons
 
-    if "otp" in text or "password" in text or "login" in text:
-        score += 20
-        reasons.append("credential_request")
 
-    if "kyc" in text or "verify" in text or "verification" in text:
-        score += 15
-        reasons.append("verification")
+def _score(message: str) -> Tuple[int, List[str]]:
+    return _score_signals(detector_signals(message, KEYWORD_MATCHER))
 
-    if "refund" in text or "prize" in text or "lottery" in text:
-        score += 15
-        reasons.append("too_good")
 
-    if "bitcoin" in text or "crypto" in text or "wallet" in text:
-        score += 20
-        reasons.append("crypto")
+def _classify_intent(text: str, hits: Dict[str, None] | None = None) -> str:
+    if hits is None:
+        hits = find_keywords(text)
+    if not FAMILY_HINTS.isdisjoint(hits):
+        return "family"
+    if not NORMAL_HINTS.isdisjoint(hits):
+        return "normal"
+    return "unknown"
 
-    if "processing fee" in text or ("fee" in text and "refund" in text):
-        score += 15
-        reasons.append("fee_request")
 
-    if PHONE_RE.search(text) or EMAIL_RE.search(text):
-        score += 5
-        reasons.append("contact_info")
+_classifier = None
+_classifier_loaded = False
 
-    return score, reasons
 
+def get_classifier():
+    # Optional ML stage: only active when SCAM_MODEL_PATH points at a trained model
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        _classifier_loaded = True
+        if SCAM_MODEL_PATH:
+            try:
+                from .classifier import LinearScamClassifier
+
+                _classifier = LinearScamClassifier.load(SCAM_MODEL_PATH)
+            except Exception:
+                _classifier = None
+    return _classifier
 
-def _classify_intent(text: str) -> str:
-    if any(k in text for k in FAMILY_HINTS):
-        return "family"
-    if any(k in text for k in NORMAL_HINTS):
-        return "normal"
-    return "unknown"
 
+def classifier_scores(messages: Sequence[str]) -> List[float] | None:
+    model = get_classifier()
+    if model is None:
+        return None
+    return [float(p) for p in model.predict_proba([m or "" for m in messages])]
 
-def detect_scam_details(message: str) -> Dict[str, object]:
-    text = (message or "").lower()
-    score, reasons = _score(message or "")
-    intent = _classify_intent(text)
+
+def detect_scam_details(
+    message: str,
+    signals: MessageSignals | None = None,
+    ml_score: float | None = None,
+) -> Dict[str, object]:
+    if signals is None:
+        # Standalone scoring skips the intel regexes (UPI, bank, IFSC, crypto)
+        signals = detector_signals(message, KEYWORD_MATCHER)
+    hits = signals.keywords
+    score, reasons = _score_signals(signals)
+    intent = _classify_intent(signals.lower, hits)
     # Fast-path triggers
-    strong_triggers = any(k in text for k in ("upi", "otp", "ifsc", "bank account", "bitcoin", "crypto", "wallet"))
-    url_trigger = bool(URL_RE.search(text)) and any(k in text for k in ("verify", "login", "update", "kyc"))
-    refund_fee_trigger = ("refund" in text) and ("fee" in text or "processing fee" in text)
+    strong_triggers = not TRIGGER_KEYWORDS.isdisjoint(hits)
+    url_trigger = bool(signals.urls) and not URL_TRIGGER_KEYWORDS.isdisjoint(hits)
+    refund_fee_trigger = "refund" in hits and "fee" in hits
 
     scam_detected = (
         score >= 35
@@ -168,13 +235,42 @@ def detect_scam_details(message: str) -> Dict[str, object]:
     if intent in {"family", "normal"} and score < 25:
         scam_detected = False
 
-    return {
+    details: Dict[str, object] = {
         "scam_detected": scam_detected,
         "score": min(score, 95),
         "intent": intent,
         "reasons": reasons,
     }
 
+    if ml_score is None:
+        scores = classifier_scores([message])
+        ml_score = scores[0] if scores else None
+    if ml_score is not None:
+        details["ml_score"] = round(ml_score, 4)
+        model = get_classifier()
+        if ml_score >= (model.threshold if model is not None else 0.5):
+            reasons.append("ml_classifier")
+            details["scam_detected"] = True
+        elif scam_detected and ml_score <= SCAM_ML_VETO and score < SCAM_ML_VETO_MAX_SCORE:
+            # The model is confident the message is benign and the heuristics only
+            # fired on weak evidence, such as a lone trigger keyword
+            reasons.append("ml_veto")
+            details["scam_detected"] = False
+    return details
+
 
 def detect_scam(message: str) -> bool:
     return bool(detect_scam_details(message).get("scam_detected"))
+
+
+def detect_scam_batch(messages: Iterable[str]) -> List[Dict[str, object]]:
+    # Bulk exports repeat the same broadcast text a lot, so score each distinct message once
+    messages = [message or "" for message in messages]
+    distinct = list(dict.fromkeys(messages))
+    # The ML stage scores every distinct message in one vectorized call
+    scores = classifier_scores(distinct)
+    cache = {
+        message: detect_scam_details(message, ml_score=scores[i] if scores else None)
+        for i, message in enumerate(distinct)
+    }
+    return [{**cache[message], "reasons": list(cache[message]["reasons"])} for message in messages]
@@ -1,43 +1,225 @@
-﻿import json
+﻿import asyncio
+import json
 import threading
-from typing import Any, Dict
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
 
-from .config import REDIS_URL, USE_REDIS, RATE_LIMIT_PER_MIN, PERSONA_DEFAULT
+from .codec import SessionCodec, get_session_codec
+from .config import (
+    PERSONA_DEFAULT,
+    RATE_LIMIT_PER_MIN,
+    REDIS_ASYNC,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_URL,
+    SESSION_MAX_COUNT,
+    SESSION_LOCK_SHARDS,
+    SESSION_MAX_HISTORY,
+    SESSION_SWEEP_INTERVAL,
+    SESSION_TTL_SECONDS,
+    USE_REDIS,
+)
+from .metrics import STAGE_SECONDS
+
+# redis.client.NEVER_DECODE: return this reply as bytes on a decoding client
+_NEVER_DECODE = "NEVER_DECODE"
 
 
 def new_session() -> Dict[str, Any]:
     return {
         "history": [],
-        "intel": {"upi_ids": [], "bank_accounts": [], "phishing_links": []},
+        "intel_seen": {},
         "scam_detected": False,
         "agent_active": False,
         "persona": PERSONA_DEFAULT,
         "persona_profile": {},
         "asked_fields": [],
+        "history_dropped": 0,
     }
 
 
-class InMemorySessionStore:
+def _copy_session(session: Dict[str, Any]) -> Dict[str, Any]:
+    # Turns replace or edit the session's containers (history, intel, the history
+    # summary) but never the history entries themselves, so two levels are copied
+    copy: Dict[str, Any] = {}
+    for key, value in session.items():
+        if isinstance(value, list):
+            value = list(value)
+        elif isinstance(value, dict):
+            value = {
+                k: list(v) if isinstance(v, list) else dict(v) if isinstance(v, dict) else v for k, v in value.items()
+            }
+        copy[key] = value
+    return copy
+
+
+class BaseSessionStore:
+    def __init__(self) -> None:
+        # One asyncio.Lock per session that has a turn in flight; entries vanish
+        # once no request holds them
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def get_session(self, session_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def save_session(self, session_id: str, session: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._session_locks[session_id] = lock
+        return lock
+
+    @asynccontextmanager
+    async def session(self, session_id: str) -> AsyncIterator[Dict[str, Any]]:
+        # Serializes turns within one session only; the session is saved when the block exits cleanly
+        lock = self._session_lock(session_id)
+        waited = time.perf_counter()
+        async with lock:
+            STAGE_SECONDS.observe(time.perf_counter() - waited, stage="session_lock")
+            with STAGE_SECONDS.time(stage="session_load"):
+                session = self.get_session(session_id) or new_session()
+            yield session
+            with STAGE_SECONDS.time(stage="session_save"):
+                self.save_session(session_id, session)
+
+
+class _SessionShard:
     def __init__(self) -> None:
-        self._store: Dict[str, Dict[str, Any]] = {}
-        self._lock = threading.Lock()
+        # Least recently used first; expiry deadlines alongside, and JSON sizes
+        # measured lazily by stats()
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.expires: Dict[str, float] = {}
+        self.sizes: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def drop(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+        self.expires.pop(session_id, None)
+        self.sizes.pop(session_id, None)
+
+
+class InMemorySessionStore(BaseSessionStore):
+    def __init__(
+        self,
+        ttl_seconds: int = 0,
+        max_sessions: int = 0,
+        max_history: int = 0,
+        sweep_interval: int = 0,
+        shards: int = 16,
+    ) -> None:
+        super().__init__()
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        # Sessions are striped across shards by id so unrelated sessions do not
+        # contend on one lock; the LRU cap is enforced per shard
+        self._shards = [_SessionShard() for _ in range(max(1, shards))]
+        self._shard_cap = -(-max_sessions // len(self._shards)) if max_sessions > 0 else 0
+        self.evicted = 0
+        self.expired = 0
+        self._stop = threading.Event()
+        if sweep_interval > 0:
+            thread = threading.Thread(target=self._sweep_loop, args=(sweep_interval,), daemon=True)
+            thread.start()
+
+    def _shard(self, session_id: str) -> _SessionShard:
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    def _touch(self, shard: _SessionShard, session_id: str, now: float) -> None:
+        shard.sessions.move_to_end(session_id)
+        if self.ttl_seconds > 0:
+            shard.expires[session_id] = now + self.ttl_seconds
+        while self._shard_cap > 0 and len(shard.sessions) > self._shard_cap:
+            shard.drop(next(iter(shard.sessions)))
+            self.evicted += 1
+
+    def _trim_history(self, session: Dict[str, Any]) -> None:
+        history = session.get("history") or []
+        if self.max_history <= 0 or len(history) <= self.max_history:
+            return
+        # Older turns are dropped; their intel already lives in session["intel_seen"]
+        dropped = len(history) - self.max_history
+        session["history"] = history[dropped:]
+        session["history_dropped"] = int(session.get("history_dropped") or 0) + dropped
 
     def get_session(self, session_id: str) -> Dict[str, Any]:
-        with self._lock:
-            if session_id not in self._store:
-                self._store[session_id] = new_session()
-            return self._store[session_id]
+        now = time.monotonic()
+        shard = self._shard(session_id)
+        with shard.lock:
+            if session_id in shard.sessions and shard.expires.get(session_id, now + 1) <= now:
+                shard.drop(session_id)
+                self.expired += 1
+            session = shard.sessions.get(session_id)
+            if session is None:
+                return new_session()
+            self._touch(shard, session_id, now)
+        # A private copy: a turn that fails or is cut short (e.g. a client leaving
+        # a stream) never reaches the stored session, only save_session does
+        return _copy_session(session)
 
     def save_session(self, session_id: str, session: Dict[str, Any]) -> None:
-        with self._lock:
-            self._store[session_id] = session
+        self._trim_history(session)
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.sessions[session_id] = session
+            shard.sizes.pop(session_id, None)
+            self._touch(shard, session_id, time.monotonic())
 
+    def sweep(self) -> int:
+        removed = 0
+        for shard in self._shards:
+            now = time.monotonic()
+            with shard.lock:
+                stale = [sid for sid, deadline in shard.expires.items() if deadline <= now]
+                for session_id in stale:
+                    shard.drop(session_id)
+                self.expired += len(stale)
+            removed += len(stale)
+        return removed
 
-class RedisSessionStore:
-    def __init__(self, redis_url: str) -> None:
+    def _sweep_loop(self, interval: int) -> None:
+        while not self._stop.wait(interval):
+            self.sweep()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, int]:
+        # Sizes are measured here, once per saved version of a session, so saves
+        # stay independent of session length; stored sessions are never mutated
+        sessions = 0
+        size = 0
+        for shard in self._shards:
+            with shard.lock:
+                sessions += len(shard.sessions)
+                pending = {sid: s for sid, s in shard.sessions.items() if sid not in shard.sizes}
+            measured = {sid: len(json.dumps(s)) for sid, s in pending.items()}
+            with shard.lock:
+                for sid, value in measured.items():
+                    # Skipped if the session was saved again meanwhile
+                    if shard.sessions.get(sid) is pending[sid]:
+                        shard.sizes[sid] = value
+                size += sum(shard.sizes.values())
+        return {
+            "sessions": sessions,
+            "bytes": size,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+
+class RedisSessionStore(BaseSessionStore):
+    def __init__(self, redis_url: str, codec: SessionCodec | None = None) -> None:
+        super().__init__()
         import redis
 
-        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+        # Raw bytes: sessions are stored through the binary session codec
+        self.client = redis.Redis.from_url(redis_url)
+        self.codec = codec or get_session_codec()
 
     def _key(self, session_id: str) -> str:
         return f"session:{session_id}"
@@ -47,31 +229,299 @@ class RedisSessionStore:
         if not data:
             return new_session()
         try:
-            return json.loads(data)
-        except json.JSONDecodeError:
+            return self.codec.decode(data)
+        except ValueError:
             return new_session()
 
     def save_session(self, session_id: str, session: Dict[str, Any]) -> None:
-        self.client.set(self._key(session_id), json.dumps(session))
+        self.client.set(self._key(session_id), self.codec.encode(session))
+
+
+INTEL_FIELDS = ("upi_ids", "bank_accounts", "phishing_links")
+# Session keys kept outside the scalar hash; "intel" only appears on sessions
+# still carrying the per-type sets of older versions
+_STRUCTURED_FIELDS = {"history", "intel", "intel_seen"}
+
+
+class _Snapshot:
+    # What a session looked like when loaded, so a save only writes the delta
+    def __init__(self, session: Dict[str, Any]) -> None:
+        self.history_len = len(session.get("history") or [])
+        self.legacy_intel = any((session.get("intel") or {}).values())
+        seen = session.get("intel_seen") or {}
+        self.seen = {(field, value) for field in INTEL_FIELDS for value in (seen.get(field) or {})}
+        self.scalars = {k: json.dumps(v) for k, v in session.items() if k not in _STRUCTURED_FIELDS}
+
+
+class AsyncRedisSessionStore(BaseSessionStore):
+    def __init__(
+        self,
+        redis_url: str = "",
+        ttl_seconds: int = 0,
+        max_history: int = 0,
+        max_connections: int = 50,
+        client: Any = None,
+    ) -> None:
+        super().__init__()
+        if client is None:
+            import redis.asyncio as aioredis
+
+            pool = aioredis.ConnectionPool.from_url(
+                redis_url, max_connections=max_connections, decode_responses=True
+            )
+            client = aioredis.Redis(connection_pool=pool)
+        # Any redis.asyncio-compatible client works here, e.g. fakeredis.aioredis.FakeRedis
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_history = max_history
+        self.codec = get_session_codec()
+
+    def _key(self, session_id: str, part: str) -> str:
+        # Hash tag keeps every key of one session in the same cluster slot for MULTI
+        return f"session:{{{session_id}}}:{part}"
+
+    def _legacy_key(self, session_id: str) -> str:
+        return f"session:{session_id}"
+
+    async def load(self, session_id: str) -> Dict[str, Any]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._key(session_id, "meta"))
+        pipe.lrange(self._key(session_id, "history"), 0, -1)
+        for field in INTEL_FIELDS:
+            pipe.smembers(self._key(session_id, f"intel:{field}"))
+        pipe.hgetall(self._key(session_id, "seen"))
+        meta, history, *rest = await pipe.execute()
+        intel_sets, seen = rest[: len(INTEL_FIELDS)], rest[len(INTEL_FIELDS)]
+
+        if not meta and not history:
+            return await self._load_legacy(session_id)
+
+        session = new_session()
+        for name, raw in meta.items():
+            session[name] = json.loads(raw)
+        session["history"] = [json.loads(item) for item in history]
+        if any(intel_sets):
+            # Older versions kept one set per intel type; the turn folds them
+            # into intel_seen and the save drops them
+            session["intel"] = {field: sorted(values) for field, values in zip(INTEL_FIELDS, intel_sets)}
+        intel_seen: Dict[str, Dict[str, Any]] = {field: {} for field in INTEL_FIELDS}
+        for name, raw in seen.items():
+            field, _, value = name.partition("\t")
+            intel_seen.setdefault(field, {})[value] = json.loads(raw)
+        session["intel_seen"] = intel_seen
+        return session
+
+    async def _load_legacy(self, session_id: str) -> Dict[str, Any]:
+        # Sessions written by RedisSessionStore as one document, JSON or binary;
+        # read undecoded since this client otherwise decodes replies as text
+        data = await self.client.execute_command("GET", self._legacy_key(session_id), **{_NEVER_DECODE: True})
+        if not data:
+            return new_session()
+        try:
+            session = self.codec.decode(data)
+        except ValueError:
+            return new_session()
+        # Loaded sessions are saved back in full under the new layout
+        session["_legacy"] = True
+        return session
+
+    async def save(self, session_id: str, session: Dict[str, Any], snapshot: _Snapshot | None = None) -> None:
+        legacy = bool(session.pop("_legacy", False))
+        if snapshot is None or legacy:
+            snapshot = _Snapshot(new_session())
+            snapshot.scalars = {}
+
+        history = session.get("history") or []
+        appended = history[snapshot.history_len :]
+        total = snapshot.history_len + len(appended)
+        if self.max_history > 0 and total > self.max_history:
+            session["history_dropped"] = int(session.get("history_dropped") or 0) + total - self.max_history
+            session["history"] = history[-self.max_history :]
+
+        pipe = self.client.pipeline(transaction=True)
+        keys = [self._key(session_id, "meta"), self._key(session_id, "history"), self._key(session_id, "seen")]
+
+        if appended:
+            pipe.rpush(keys[1], *(json.dumps(item) for item in appended))
+            if self.max_history > 0:
+                pipe.ltrim(keys[1], -self.max_history, -1)
+
+        if snapshot.legacy_intel and "intel" not in session:
+            pipe.delete(*(self._key(session_id, f"intel:{field}") for field in INTEL_FIELDS))
+
+        seen = session.get("intel_seen") or {}
+        for field in INTEL_FIELDS:
+            for value, first in (seen.get(field) or {}).items():
+                if (field, value) not in snapshot.seen:
+                    pipe.hsetnx(keys[2], f"{field}\t{value}", json.dumps(first))
+
+        changed = {}
+        for name, value in session.items():
+            if name in _STRUCTURED_FIELDS:
+                continue
+            raw = json.dumps(value)
+            if snapshot.scalars.get(name) != raw:
+                changed[name] = raw
+        if changed:
+            pipe.hset(keys[0], mapping=changed)
+
+        if self.ttl_seconds > 0:
+            for key in keys:
+                pipe.expire(key, self.ttl_seconds)
+        if legacy:
+            pipe.delete(self._legacy_key(session_id))
+        await pipe.execute()
+
+    @asynccontextmanager
+    async def session(self, session_id: str) -> AsyncIterator[Dict[str, Any]]:
+        lock = self._session_lock(session_id)
+        waited = time.perf_counter()
+        async with lock:
+            STAGE_SECONDS.observe(time.perf_counter() - waited, stage="session_lock")
+            with STAGE_SECONDS.time(stage="session_load"):
+                session = await self.load(session_id)
+                snapshot = None if session.get("_legacy") else _Snapshot(session)
+            yield session
+            with STAGE_SECONDS.time(stage="session_save"):
+                await self.save(session_id, session, snapshot)
+
+    async def close(self) -> None:
+        await self.client.aclose()
 
 
 class RateLimiter:
-    def __init__(self, per_minute: int) -> None:
+    def __init__(self, per_minute: int, stripes: int = 16) -> None:
+        # Token bucket: holds up to per_minute tokens and refills continuously
         self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._buckets: Dict[str, List[float]] = {}
+        self._locks = [threading.Lock() for _ in range(max(1, stripes))]
+        self._next_prune = time.monotonic() + 60
+
+    def _lock(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    def check(self, key: str, cost: int = 1) -> float:
+        # Seconds until the request would be allowed; 0 means it was allowed and charged
+        if self.per_minute <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock(key):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.capacity, now]
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                wait = 0.0
+            else:
+                bucket[0] = tokens
+                wait = (cost - tokens) / self.rate
+        if now >= self._next_prune:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now: float) -> None:
+        self._next_prune = now + 60
+        # A bucket idle for a full minute has refilled, so forgetting it changes nothing
+        for key, bucket in list(self._buckets.items()):
+            if now - bucket[1] >= 60:
+                with self._lock(key):
+                    if now - bucket[1] >= 60:
+                        self._buckets.pop(key, None)
 
     def allow(self, key: str) -> bool:
-        # Stub for hackathon: always allow. Replace with Redis token bucket.
-        return True
+        return self.check(key) == 0.0
+
+    async def acquire(self, key: str, cost: int = 1) -> float:
+        return self.check(key, cost)
+
+
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate) + 1000)
+return wait
+"""
+
+
+class RedisRateLimiter:
+    def __init__(self, per_minute: int, redis_url: str = "", client: Any = None) -> None:
+        # Same token bucket as RateLimiter, evaluated atomically in Redis so the
+        # limit holds across workers; the Redis clock is used for refills
+        if client is None:
+            import redis.asyncio as aioredis
+
+            client = aioredis.Redis.from_url(redis_url, decode_responses=True)
+        self.client = client
+        self.per_minute = per_minute
+        self._script = client.register_script(_TOKEN_BUCKET_LUA)
+
+    async def acquire(self, key: str, cost: int = 1) -> float:
+        if self.per_minute <= 0:
+            return 0.0
+        rate_per_ms = self.per_minute / 60000.0
+        try:
+            wait_ms = await self._script(keys=[f"ratelimit:{key}"], args=[self.per_minute, rate_per_ms, cost])
+        except Exception:
+            # Fail open: an unreachable Redis must not take the honeypot offline
+            return 0.0
+        return int(wait_ms) / 1000.0
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def _in_memory_store() -> InMemorySessionStore:
+    return InMemorySessionStore(
+        ttl_seconds=SESSION_TTL_SECONDS,
+        max_sessions=SESSION_MAX_COUNT,
+        max_history=SESSION_MAX_HISTORY,
+        sweep_interval=SESSION_SWEEP_INTERVAL,
+        shards=SESSION_LOCK_SHARDS,
+    )
 
 
 def get_session_store():
     if USE_REDIS and REDIS_URL:
         try:
+            if REDIS_ASYNC:
+                return AsyncRedisSessionStore(
+                    REDIS_URL,
+                    ttl_seconds=SESSION_TTL_SECONDS,
+                    max_history=SESSION_MAX_HISTORY,
+                    max_connections=REDIS_MAX_CONNECTIONS,
+                )
             return RedisSessionStore(REDIS_URL)
         except Exception:
-            return InMemorySessionStore()
-    return InMemorySessionStore()
+            return _in_memory_store()
+    return _in_memory_store()
 
 
-def get_rate_limiter() -> RateLimiter:
-    return RateLimiter(RATE_LIMIT_PER_MIN)
+def get_rate_limiter(per_minute: int = RATE_LIMIT_PER_MIN):
+    if USE_REDIS and REDIS_URL:
+        try:
+            return RedisRateLimiter(per_minute, REDIS_URL)
+        except Exception:
+            return RateLimiter(per_minute)
+    return RateLimiter(per_minute)
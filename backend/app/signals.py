@@ -0,0 +1,109 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+URL_RE = re.compile(r"\b(?:https?://|www\.)[^\s<>\"]+\b", re.IGNORECASE)
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+EMAIL_RE = re.compile(r"[A-Z0-9._%+-]+@[A-Z0-9.-]+\.[A-Z]{2,}", re.IGNORECASE)
+CRYPTO_RE = re.compile(r"\b(?:bc1|[13])[a-zA-HJ-NP-Z0-9]{25,39}\b", re.IGNORECASE)
+UPI_RE = re.compile(r"\b[a-zA-Z0-9._-]{2,256}@[a-zA-Z]{2,64}\b")
+BANK_RE = re.compile(r"\b\d{9,18}\b")
+IFSC_RE = re.compile(r"\b[A-Z]{4}0[A-Z0-9]{6}\b", re.IGNORECASE)
+
+
+def _automaton(patterns: Iterable[str]):
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    automaton = ahocorasick.Automaton()
+    for pattern in patterns:
+        automaton.add_word(pattern, (pattern, len(pattern)))
+    automaton.make_automaton()
+    return automaton
+
+
+class KeywordMatcher:
+    def __init__(self, patterns: Iterable[str]) -> None:
+        # Longest first, so keywords starting at the same offset are reported
+        # longest first
+        self._ordered = tuple(sorted(set(patterns), key=lambda p: (-len(p), p)))
+        # pyahocorasick (a requirement) reports every keyword, overlapping ones
+        # included, in one pass over the text. Where it cannot be installed each
+        # keyword is a C substring search, which CPython runs faster than one
+        # large regex tried at every offset
+        self._automaton = _automaton(self._ordered) if self._ordered else None
+
+    def find(self, text: str) -> Dict[str, None]:
+        # Every known keyword in lowercased text, in order of first occurrence
+        if self._automaton is None:
+            hits = [kw for kw in self._ordered if kw in text]
+            if len(hits) > 1:
+                hits.sort(key=lambda kw: (text.find(kw), -len(kw)))
+            return dict.fromkeys(hits)
+        first: Dict[str, int] = {}
+        for end, (kw, size) in self._automaton.iter(text):
+            if kw not in first:
+                first[kw] = end - size
+        return dict.fromkeys(sorted(first, key=lambda kw: (first[kw], -len(kw))))
+
+
+@dataclass
+class MessageSignals:
+    text: str
+    lower: str
+    urls: List[str] = field(default_factory=list)
+    phones: List[str] = field(default_factory=list)
+    emails: List[str] = field(default_factory=list)
+    crypto_addresses: List[str] = field(default_factory=list)
+    upi_ids: List[str] = field(default_factory=list)
+    # Raw digit runs with their span, so callers can look at the surrounding text
+    bank_numbers: List[Tuple[str, int, int]] = field(default_factory=list)
+    ifsc_codes: List[str] = field(default_factory=list)
+    keywords: Dict[str, None] = field(default_factory=dict)
+
+    @property
+    def has_contact(self) -> bool:
+        return bool(self.phones or self.emails)
+
+
+def extract_signals(text: str, keywords: KeywordMatcher | None = None) -> MessageSignals:
+    text = text or ""
+    lower = text.lower()
+    signals = MessageSignals(text=text, lower=lower)
+    if not text:
+        return signals
+
+    signals.urls = [m.group(0) for m in URL_RE.finditer(text)]
+    signals.phones = [m.group(0) for m in PHONE_RE.finditer(text)]
+    # Both need an '@'; skipping them otherwise saves the two most expensive scans
+    if "@" in text:
+        signals.emails = [m.group(0) for m in EMAIL_RE.finditer(text)]
+        signals.upi_ids = [m.group(0) for m in UPI_RE.finditer(text)]
+    signals.crypto_addresses = [m.group(0) for m in CRYPTO_RE.finditer(text)]
+    signals.bank_numbers = [(m.group(0), m.start(), m.end()) for m in BANK_RE.finditer(text)]
+    signals.ifsc_codes = [m.group(0).upper() for m in IFSC_RE.finditer(text)]
+    if keywords is not None:
+        signals.keywords = keywords.find(lower)
+    return signals
+
+
+def detector_signals(text: str, keywords: KeywordMatcher) -> MessageSignals:
+    # Only what scam scoring reads: keywords and whether the text has a link or
+    # contact details. Each regex stops at its first match, so the lists hold at
+    # most one item; use extract_signals when the matches themselves are needed
+    text = text or ""
+    lower = text.lower()
+    signals = MessageSignals(text=text, lower=lower)
+    if not text:
+        return signals
+    for pattern, found in ((URL_RE, signals.urls), (PHONE_RE, signals.phones)):
+        match = pattern.search(text)
+        if match:
+            found.append(match.group(0))
+    if not signals.phones and "@" in text:
+        match = EMAIL_RE.search(text)
+        if match:
+            signals.emails.append(match.group(0))
+    signals.keywords = keywords.find(lower)
+    return signals
@@ -0,0 +1,181 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from .agent import get_profile
+from .blocklist import get_blocklist
+from .campaigns import detect_with_campaigns, get_campaign_index
+from .config import PERSONA_DEFAULT
+from .intel_extractor import IntelAccumulator
+from .metrics import KNOWN_BAD_HITS, SCAM_DETECTIONS, STAGE_SECONDS
+from .models import ExtractedIntel, MessageResponse
+from .scam_detector import message_signals
+from .signals import MessageSignals, extract_signals
+
+
+def prepare_session(session: Dict[str, Any]) -> Dict[str, Any]:
+    session.setdefault("history", [])
+    session.setdefault("intel_seen", {})
+    session.setdefault("scam_detected", False)
+    session.setdefault("agent_active", False)
+    session.setdefault("persona", PERSONA_DEFAULT)
+    session.setdefault("persona_profile", {})
+    session.setdefault("asked_fields", [])
+    session.setdefault("history_summary", {})
+    session.setdefault("campaign_id", None)
+    return session
+
+
+def turn_index(session: Dict[str, Any]) -> int:
+    # Position of the latest history entry, counting turns trimmed by the store
+    return int(session.get("history_dropped") or 0) + len(session["history"]) - 1
+
+
+@dataclass
+class Turn:
+    details: Dict[str, object]
+    persona: str
+    intel: IntelAccumulator
+    signals: MessageSignals
+    # Intel found in the scammer's message this turn, repeats included
+    found: Dict[str, List[str]] = field(default_factory=dict)
+    # History position of the scammer's message
+    index: int = 0
+
+
+def scan_message(message: str, ml_score: float | None = None) -> Tuple[MessageSignals, Dict[str, object]]:
+    with STAGE_SECONDS.time(stage="detection"):
+        signals = message_signals(message)
+        details = detect_with_campaigns(message, signals, ml_score)
+    return signals, details
+
+
+def check_known_bad(found: Dict[str, List[str]]) -> List[str]:
+    blocklist = get_blocklist()
+    if blocklist is None or not any(found.values()):
+        return []
+    hits = blocklist.check(found)
+    for key in hits:
+        KNOWN_BAD_HITS.inc(field=key.partition(":")[0])
+    return hits
+
+
+def begin_turn(
+    session: Dict[str, Any],
+    message: str,
+    persona: str | None,
+    scan: Tuple[MessageSignals, Dict[str, object]] | None = None,
+) -> Turn:
+    session["history"].append({"role": "user", "content": message})
+    # The message is scanned once; detection, intel and risk scoring share the signals
+    signals, details = scan or scan_message(message)
+    with STAGE_SECONDS.time(stage="extraction"):
+        intel = IntelAccumulator.from_session(session)
+        position = turn_index(session)
+        found = intel.extract(message, position, "user", signals)
+    known_bad = check_known_bad(found)
+    if known_bad:
+        # Scans can be shared between turns, so the verdict is copied, not edited
+        details = {
+            **details,
+            "scam_detected": True,
+            "reasons": [*details.get("reasons", []), "known_bad"],
+            "known_bad": known_bad,
+        }
+    if details.get("scam_detected"):
+        SCAM_DETECTIONS.inc()
+        # A session joins the first scam campaign it is seen in
+        campaign_id = details.get("campaign_id")
+        if campaign_id and not session.get("campaign_id"):
+            session["campaign_id"] = campaign_id
+            index = get_campaign_index()
+            if index is not None:
+                index.tag_session(str(campaign_id))
+
+    # Determine persona early so UI always reflects selection
+    persona = (persona or session.get("persona") or PERSONA_DEFAULT).lower()
+    session["persona"] = persona
+    session["persona_profile"] = get_profile(persona, session.get("persona_profile") or {})
+
+    scam_detected = session.get("scam_detected", False) or bool(details.get("scam_detected"))
+    session["scam_detected"] = scam_detected
+    # Activate agent if strong signals or moderate score with unknown intent
+    score = int(details.get("score") or 0) if details else 0
+    intent = str(details.get("intent") or "unknown") if details else "unknown"
+    if scam_detected or known_bad or (score >= 25 and intent == "unknown"):
+        session["agent_active"] = True
+    return Turn(details, persona, intel, signals, found, position)
+
+
+def agent_inputs(session: Dict[str, Any], intel: IntelAccumulator, persona: str) -> Dict[str, Any]:
+    return {
+        "intel": intel.as_dict(),
+        "asked": session.get("asked_fields", []),
+        "profile": session.get("persona_profile") or get_profile(persona, {}),
+        # Rolling summary of turns that fell out of the LLM history window
+        "summary": session["history_summary"],
+        "offset": int(session.get("history_dropped") or 0),
+    }
+
+
+def finish_turn(session_id: str, session: Dict[str, Any], turn: Turn, agent_reply: str) -> MessageResponse:
+    details = turn.details
+    scam_detected = session.get("scam_detected", False)
+    agent_active = session.get("agent_active", False)
+    session["history"].append({"role": "assistant", "content": agent_reply})
+
+    with STAGE_SECONDS.time(stage="extraction"):
+        reply_signals = extract_signals(agent_reply)
+        if agent_reply:
+            turn.intel.extract(agent_reply, turn_index(session), "assistant", reply_signals)
+        turn.intel.to_session(session)
+        intel = turn.intel.as_dict()
+
+    # Update asked fields based on reply content
+    asked_fields = set(session.get("asked_fields", []))
+    reply_text = (agent_reply or "").lower()
+    if "upi" in reply_text:
+        asked_fields.add("upi")
+    if "account" in reply_text or "ifsc" in reply_text:
+        asked_fields.add("bank_ifsc")
+    if "link" in reply_text or "url" in reply_text:
+        asked_fields.add("link")
+    if "wallet" in reply_text or "crypto" in reply_text or "bitcoin" in reply_text:
+        asked_fields.add("crypto_wallet")
+    session["asked_fields"] = sorted(asked_fields)
+
+    # Risk score based on signals (0-95)
+    scanned = (turn.signals, reply_signals)
+    has_email = any(s.emails for s in scanned)
+    has_phone = any(s.phones for s in scanned)
+    has_crypto = any(s.crypto_addresses for s in scanned)
+
+    risk_score = 0
+    if scam_detected:
+        risk_score += 40
+    if intel.get("phishing_links"):
+        risk_score += 25
+    if intel.get("upi_ids") or intel.get("bank_accounts"):
+        risk_score += 20
+    if has_phone:
+        risk_score += 5
+    if has_email:
+        risk_score += 5
+    if has_crypto:
+        risk_score += 10
+    risk_score = min(risk_score, 95)
+
+    return MessageResponse(
+        session_id=session_id,
+        scam_detected=scam_detected,
+        agent_active=agent_active,
+        extracted_intel=ExtractedIntel(**intel),
+        agent_reply=agent_reply,
+        risk_score=risk_score,
+        persona=session.get("persona"),
+        persona_profile=session.get("persona_profile"),
+        asked_fields=session.get("asked_fields"),
+        scam_intent=str(details.get("intent")) if details else None,
+        scam_reasons=list(details.get("reasons")) if details else None,
+        scam_score=int(details.get("score")) if details and details.get("score") is not None else None,
+        campaign_id=str(details.get("campaign_id")) if details and details.get("campaign_id") else None,
+    )
@@ -0,0 +1,50 @@
+import random
+from typing import Dict, List
+
+SCAM_TEMPLATES = [
+    "Dear customer, your KYC is pending. Click www.sbi-kyc{n}.in to verify immediately or your account will be blocked.",
+    "Congratulations! You won a lottery prize of Rs {n}. Pay the processing fee to scam{n}@okaxis to claim your refund.",
+    "Your bank account {acct} is suspended. Share the OTP sent to {phone} and IFSC SBIN000{n4} for verification.",
+    "Invest in bitcoin today, send to wallet 1BoatSLRHtKNngkdXEeobR76b53LETtpyT and double your money within 24 hours.",
+    "HR team here. Your job offer needs a security deposit. Transfer to account {acct} IFSC HDFC0{n6} urgently.",
+]
+
+NORMAL_TEMPLATES = [
+    "Hi mom, I will be home by {n2} tonight.",
+    "Thanks bro, see you at the meeting tomorrow.",
+    "Good morning! Can you call me when you are free?",
+    "Okay, let's meet at the cafe around {n2}.",
+]
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        n=rng.randint(100, 99999),
+        n2=rng.randint(1, 12),
+        n4=rng.randint(1000, 9999),
+        n6=rng.randint(100000, 999999),
+        acct=rng.randint(10**11, 10**12 - 1),
+        phone=f"+91 9{rng.randint(100000000, 999999999)}",
+    )
+
+
+def _adversarial(rng: random.Random) -> List[str]:
+    # Inputs aimed at the regexes: long digit runs, many '@', no whitespace,
+    # repeated keyword prefixes and non-ASCII text
+    return [
+        "1" * 4000,
+        "a@" * 2000,
+        "x" * 5000 + "@" + "y" * 60,
+        "verifyverificationverif" * 200,
+        "www." + "a" * 3000,
+        " ".join(str(rng.randint(0, 9)) for _ in range(3000)),
+        "İstanbul बैंक खाता " * 300,
+        "upi@" + "." * 3000,
+    ]
+
+
+def build_corpus(seed: int = 7) -> Dict[str, List[str]]:
+    rng = random.Random(seed)
+    short = [_fill(rng.choice(SCAM_TEMPLATES + NORMAL_TEMPLATES), rng) for _ in range(200)]
+    long = [" ".join(_fill(rng.choice(SCAM_TEMPLATES), rng) for _ in range(40)) for _ in range(20)]
+    return {"short": short, "long": long, "adversarial": _adversarial(rng)}
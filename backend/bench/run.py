@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+# The end-to-end case drives the real app: mock LLM, in-memory store, no rate limits
+os.environ.setdefault("LLM_PROVIDER", "mock")
+os.environ.setdefault("USE_REDIS", "false")
+os.environ.setdefault("RATE_LIMIT_PER_MIN", "0")
+os.environ.setdefault("RATE_LIMIT_IP_PER_MIN", "0")
+os.environ.setdefault("REPLY_CACHE_ENABLED", "false")
+os.environ.setdefault("SESSION_SWEEP_INTERVAL", "0")
+# The app logs JSON lines to stdout; only warnings get through, so stdout stays
+# a single JSON report that can be redirected to a file
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.agent import _rule_based_reply  # noqa: E402
+from app.intel_extractor import extract_intel, merge_intel  # noqa: E402
+from app.scam_detector import _score, detect_scam_details  # noqa: E402
+from app.codec import SessionCodec  # noqa: E402
+from app.session_store import AsyncRedisSessionStore, InMemorySessionStore, RedisSessionStore, new_session  # noqa: E402
+
+from bench.corpus import build_corpus  # noqa: E402
+
+
+def _summarize(samples: List[float], items: int) -> Dict[str, float]:
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "iterations": len(ordered),
+        "items_per_iteration": items,
+        "mean_us": round(statistics.fmean(ordered) * 1e6, 2),
+        "p50_us": round(ordered[len(ordered) // 2] * 1e6, 2),
+        "p99_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 2),
+        "items_per_s": round(items * len(ordered) / total, 1) if total else 0.0,
+    }
+
+
+def bench(fn: Callable[[], Any], items: int, budget: float, min_iterations: int = 3) -> Dict[str, float]:
+    # Run until the time budget is spent (at least min_iterations), one sample per call
+    fn()
+    samples: List[float] = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < min_iterations or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summarize(samples, items)
+
+
+async def abench(fn: Callable[[], Awaitable[Any]], items: int, budget: float, min_iterations: int = 3) -> Dict[str, float]:
+    await fn()
+    samples: List[float] = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < min_iterations or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return _summarize(samples, items)
+
+
+def _loop(fn: Callable[[str], Any], texts: List[str]) -> Callable[[], None]:
+    def run() -> None:
+        for text in texts:
+            fn(text)
+
+    return run
+
+
+def bench_pipeline(corpus: Dict[str, List[str]], budget: float) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for name, texts in corpus.items():
+        results[f"score/{name}"] = bench(_loop(_score, texts), len(texts), budget)
+        results[f"detect_scam_details/{name}"] = bench(_loop(detect_scam_details, texts), len(texts), budget)
+        results[f"extract_intel/{name}"] = bench(_loop(extract_intel, texts), len(texts), budget)
+
+    found = [extract_intel(text) for text in corpus["short"]]
+
+    def merge_all() -> None:
+        intel: Dict[str, List[str]] = {"upi_ids": [], "bank_accounts": [], "phishing_links": []}
+        for item in found:
+            intel = merge_intel(intel, item)
+
+    results["merge_intel/short"] = bench(merge_all, len(found), budget)
+
+    histories = [[{"role": "user", "content": text}] for text in corpus["short"]]
+
+    def replies() -> None:
+        for history in histories:
+            _rule_based_reply(history, "elderly")
+
+    results["rule_based_reply/short"] = bench(replies, len(histories), budget)
+    return results
+
+
+def _sample_session(corpus: Dict[str, List[str]], turns: int) -> Dict[str, Any]:
+    session = new_session()
+    for text in corpus["short"][:turns]:
+        session["history"].append({"role": "user", "content": text})
+        session["history"].append({"role": "assistant", "content": _rule_based_reply(session["history"])})
+    return session
+
+
+def bench_stores(corpus: Dict[str, List[str]], budget: float) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    session = _sample_session(corpus, 50)
+
+    memory = InMemorySessionStore(ttl_seconds=3600, max_sessions=100000, max_history=200)
+    results["store/memory/save"] = bench(lambda: memory.save_session("bench", session), 1, budget)
+    results["store/memory/get"] = bench(lambda: memory.get_session("bench"), 1, budget)
+
+    redis_url = os.getenv("BENCH_REDIS_URL", "")
+    sync_client = async_client = None
+    if redis_url:
+        import redis
+        import redis.asyncio as aioredis
+
+        sync_client = redis.Redis.from_url(redis_url)
+        async_client = aioredis.Redis.from_url(redis_url, decode_responses=True)
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            results["store/redis"] = {"skipped": "set BENCH_REDIS_URL or install fakeredis"}
+            return results
+        sync_client = fakeredis.FakeRedis()
+        async_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+    sync_store = RedisSessionStore(redis_url or "redis://localhost")
+    sync_store.client = sync_client
+    results["store/redis/save"] = bench(lambda: sync_store.save_session("bench", session), 1, budget)
+    results["store/redis/get"] = bench(lambda: sync_store.get_session("bench"), 1, budget)
+
+    async_store = AsyncRedisSessionStore(client=async_client, ttl_seconds=3600, max_history=200)
+
+    async def turn() -> None:
+        # One message turn: load, append a user/assistant pair, save the delta
+        async with async_store.session("bench-async") as s:
+            s["history"].append({"role": "user", "content": corpus["short"][0]})
+            s["history"].append({"role": "assistant", "content": "ok"})
+
+    async def run_async() -> Dict[str, Any]:
+        await async_store.save("bench-async", _sample_session(corpus, 50))
+        return {
+            "store/redis_async/load": await abench(lambda: async_store.load("bench-async"), 1, budget),
+            "store/redis_async/turn": await abench(turn, 1, budget),
+        }
+
+    results.update(asyncio.run(run_async()))
+    return results
+
+
+def bench_codecs(corpus: Dict[str, List[str]], budget: float) -> Dict[str, Any]:
+    # Encode/decode time and stored size of whole-session Redis values; "legacy"
+    # is the plain json.dumps text written before the codec existed
+    results: Dict[str, Any] = {}
+    variants = [("legacy", "none")] + [
+        (serializer, compression) for serializer in ("json", "msgpack") for compression in ("none", "zlib", "zstd")
+    ]
+    for turns in (10, 100):
+        session = _sample_session(corpus, turns)
+        for serializer, compression in variants:
+            codec = SessionCodec(serializer, compression)
+            if (codec.serializer, codec.compression) != (serializer, compression) and serializer != "legacy":
+                results[f"codec/{serializer}+{compression}/{turns}"] = {"skipped": "codec package not installed"}
+                continue
+            name = "legacy" if serializer == "legacy" else f"{serializer}+{compression}"
+            data = codec.encode(session)
+            results[f"codec/{name}/{turns}/encode"] = {**bench(lambda: codec.encode(session), 1, budget), "bytes": len(data)}
+            results[f"codec/{name}/{turns}/decode"] = bench(lambda: codec.decode(data), 1, budget)
+    return results
+
+
+def bench_end_to_end(corpus: Dict[str, List[str]], budget: float) -> Dict[str, Any]:
+    import httpx
+
+    from app.config import API_KEY
+    from app.main import app
+
+    async def run() -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in ("short", "long"):
+                texts = corpus[name]
+                counter = {"n": 0}
+
+                async def post() -> None:
+                    text = texts[counter["n"] % len(texts)]
+                    counter["n"] += 1
+                    payload = {"session_id": f"bench-{name}-{counter['n'] % 50}", "message": text, "api_key": API_KEY}
+                    resp = await client.post("/message", json=payload)
+                    resp.raise_for_status()
+
+                results[f"message/{name}"] = await abench(post, 1, budget)
+        return results
+
+    return asyncio.run(run())
+
+
+def compare(results: Dict[str, Any], baseline_path: str, tolerance: float) -> List[str]:
+    # A case regresses when its mean time grows by more than the tolerance
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = json.load(handle).get("results", {})
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not isinstance(before, dict) or "mean_us" not in before or "mean_us" not in current:
+            continue
+        if current["mean_us"] > before["mean_us"] * (1 + tolerance):
+            regressions.append(f"{name}: {before['mean_us']}us -> {current['mean_us']}us")
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the /message hot path and each pipeline stage")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds spent per case")
+    parser.add_argument("--only", choices=["pipeline", "stores", "codecs", "e2e"], action="append")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus()
+    groups = args.only or ["pipeline", "stores", "codecs", "e2e"]
+    results: Dict[str, Any] = {}
+    if "pipeline" in groups:
+        results.update(bench_pipeline(corpus, args.budget))
+    if "stores" in groups:
+        results.update(bench_stores(corpus, args.budget))
+    if "codecs" in groups:
+        results.update(bench_codecs(corpus, args.budget))
+    if "e2e" in groups:
+        results.update(bench_end_to_end(corpus, args.budget))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "budget_s": args.budget,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+from app import campaigns
+from app.campaigns import CampaignIndex, detect_with_campaigns
+from app.scam_detector import message_signals
+
+FOUNDER = "please send the payment through upi to my friend today evening after lunch"
+# Same text plus a greeting: different evidence, rescored, and no longer a scam
+BENIGN = FOUNDER + " thanks"
+
+
+def _detect(message):
+    return detect_with_campaigns(message, message_signals(message))
+
+
+def test_rescored_non_scam_does_not_join_the_campaign(monkeypatch):
+    index = CampaignIndex()
+    monkeypatch.setattr(campaigns, "_index", index)
+
+    founder = _detect(FOUNDER)
+    assert founder["scam_detected"] is True
+    campaign = index._campaigns[founder["campaign_id"]]
+
+    details = _detect(BENIGN)
+    assert details["scam_detected"] is False
+    assert "campaign_id" not in details
+    assert campaign.messages == 1
+    assert CampaignIndex.normalize(BENIGN) not in index._exact
+
+    assert _detect(FOUNDER)["campaign_id"] == campaign.campaign_id
+    assert campaign.messages == 2
@@ -0,0 +1,25 @@
+from app.intel_extractor import IntelAccumulator
+
+
+def test_accumulator_appends_into_the_session():
+    session = {"intel_seen": {"upi_ids": {"a@okaxis": [0, "user"]}}}
+    acc = IntelAccumulator.from_session(session)
+    stored = session["intel_seen"]["upi_ids"]
+
+    acc.add({"upi_ids": ["a@okaxis", "b@okaxis"], "bank_accounts": ["123456789012"]}, 3, "user")
+    acc.to_session(session)
+
+    # The stored entries are extended in place, not rebuilt
+    assert session["intel_seen"]["upi_ids"] is stored
+    assert list(stored.items()) == [("a@okaxis", [0, "user"]), ("b@okaxis", [3, "user"])]
+    assert acc.first_seen("bank_accounts", "123456789012") == (3, "user")
+    assert acc.as_dict()["upi_ids"] == ["a@okaxis", "b@okaxis"]
+
+
+def test_legacy_intel_lists_are_folded_in_once():
+    session = {"intel": {"upi_ids": ["old@okaxis"], "bank_accounts": [], "phishing_links": []}}
+    acc = IntelAccumulator.from_session(session)
+    acc.to_session(session)
+    assert "intel" not in session
+    assert session["intel_seen"]["upi_ids"] == {"old@okaxis": [-1, "unknown"]}
+    assert acc.first_seen("upi_ids", "old@okaxis") == (-1, "unknown")
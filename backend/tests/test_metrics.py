@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+
+from app.config import API_KEY
+from app.main import app
+
+
+def _gauge(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    return None
+
+
+def test_metrics_report_session_store_stats():
+    with TestClient(app) as client:
+        for session_id in ("m1", "m2"):
+            response = client.post("/message", json={"session_id": session_id, "message": "hi", "api_key": API_KEY})
+            assert response.status_code == 200
+        text = client.get("/metrics").text
+    assert _gauge(text, "honeypot_session_store_sessions") >= 2
+    assert _gauge(text, "honeypot_session_store_bytes") > 0
+    assert 'honeypot_session_store_removed{reason="evicted"}' in text
@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+from app.config import API_KEY, RATE_LIMIT_IP_PER_MIN, RATE_LIMIT_PER_MIN
+from app.main import app
+
+
+def _batch(messages):
+    return {"api_key": API_KEY, "messages": messages}
+
+
+def test_batch_above_ip_capacity_is_rejected_without_charging():
+    messages = [{"session_id": f"s{i}", "message": "hello"} for i in range(RATE_LIMIT_IP_PER_MIN + 100)]
+    with TestClient(app) as client:
+        response = client.post("/message/batch", json=_batch(messages))
+        assert response.status_code == 413
+        assert "RATE_LIMIT_IP_PER_MIN" in response.json()["detail"]
+
+        # Nothing was charged, so a batch that fits still goes through
+        response = client.post("/message/batch", json=_batch(messages[:10]))
+        assert response.status_code == 200
+
+
+def test_batch_above_session_capacity_is_rejected():
+    messages = [{"session_id": "one", "message": "hello"}] * (RATE_LIMIT_PER_MIN + 1)
+    with TestClient(app) as client:
+        response = client.post("/message/batch", json=_batch(messages))
+        assert response.status_code == 413
+        assert "RATE_LIMIT_PER_MIN" in response.json()["detail"]
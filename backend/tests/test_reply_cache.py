@@ -0,0 +1,46 @@
+import asyncio
+from typing import Dict, List
+
+import fakeredis
+import fakeredis.aioredis
+
+from app.agent import BaseLLMClient, HoneyPotAgent, MockLLMClient, ReplyCache
+
+HISTORY = [{"role": "user", "content": "Your KYC is pending, pay the fee to scam@okaxis"}]
+
+
+class EchoClient(BaseLLMClient):
+    name = "echo"
+
+    def generate(self, messages: List[Dict[str, str]]) -> str:
+        return "which bank is this?"
+
+
+def _cache():
+    cache = ReplyCache(100, 60)
+    server = fakeredis.FakeServer()
+    cache._redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    cache._aredis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return cache
+
+
+def test_rule_based_replies_stay_in_process():
+    cache = _cache()
+    agent = HoneyPotAgent(MockLLMClient(), cache)
+
+    async def run():
+        await agent.areply(HISTORY, "elderly")
+        await agent.anormal_reply("elderly", "hi mom")
+        return await cache._aredis.keys("reply:*")
+
+    assert asyncio.run(run()) == []
+    assert agent.normal_reply("elderly", "hi mom") == agent.normal_reply("elderly", "hi mom")
+    assert cache._redis.keys("reply:*") == []
+    assert cache.stats()["size"] == 2
+
+
+def test_llm_replies_use_the_shared_tier():
+    cache = _cache()
+    agent = HoneyPotAgent(EchoClient(), cache)
+    assert asyncio.run(agent.areply(HISTORY, "elderly")) == "which bank is this?"
+    assert len(cache._redis.keys("reply:*")) == 1
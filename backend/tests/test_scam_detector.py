@@ -0,0 +1,37 @@
+from app.scam_detector import detect_scam_details, message_signals
+
+BENIGN_UPI = "I paid the electricity bill through upi, all done"
+PHISHING = "URGENT: your bank account is blocked, verify your KYC at http://sbi-kyc.example.com and share the OTP"
+
+
+def test_low_ml_score_vetoes_weak_heuristic_trigger():
+    # A lone "upi" trips the heuristic fast path
+    assert detect_scam_details(BENIGN_UPI)["scam_detected"] is True
+
+    details = detect_scam_details(BENIGN_UPI, ml_score=0.05)
+    assert details["scam_detected"] is False
+    assert "ml_veto" in details["reasons"]
+
+
+def test_low_ml_score_does_not_overrule_strong_evidence():
+    details = detect_scam_details(PHISHING, ml_score=0.05)
+    assert details["scam_detected"] is True
+    assert "ml_veto" not in details["reasons"]
+
+
+def test_uncertain_ml_score_keeps_heuristic_verdict():
+    details = detect_scam_details(BENIGN_UPI, ml_score=0.4)
+    assert details["scam_detected"] is True
+    assert "ml_veto" not in details["reasons"]
+
+
+def test_high_ml_score_flags_message():
+    details = detect_scam_details("see you at the cafe tonight", ml_score=0.9)
+    assert details["scam_detected"] is True
+    assert "ml_classifier" in details["reasons"]
+
+
+def test_standalone_scoring_matches_shared_signals():
+    messages = [BENIGN_UPI, PHISHING, "call me on +91 98765 43210 or mail a@b.in", "hi mom", "", "x" * 500 + "@y"]
+    for message in messages:
+        assert detect_scam_details(message) == detect_scam_details(message, signals=message_signals(message))
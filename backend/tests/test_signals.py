@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+from app.scam_detector import SCAM_KEYWORDS
+from app.signals import KeywordMatcher
+
+pytest.importorskip("ahocorasick")
+
+
+def _texts():
+    rng = random.Random(11)
+    words = sorted(SCAM_KEYWORDS) + ["hello", "bankaccount", "otpotp", "re", "fund", " ", "upi@", "kyc-"]
+    yield ""
+    yield "nothing to see here"
+    yield "verifyverificationverif" * 20
+    for _ in range(500):
+        yield "".join(rng.choice(words) + rng.choice(["", " ", "."]) for _ in range(rng.randint(1, 40)))
+
+
+def test_fallback_matches_automaton():
+    matcher = KeywordMatcher(SCAM_KEYWORDS)
+    fallback = KeywordMatcher(SCAM_KEYWORDS)
+    fallback._automaton = None
+    assert matcher._automaton is not None
+    for text in _texts():
+        assert list(matcher.find(text)) == list(fallback.find(text)), text
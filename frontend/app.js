@@ -50,6 +50,34 @@ function appendBubble(role, text) {
   wrap.textContent = text;
   chat.appendChild(wrap);
   chat.scrollTop = chat.scrollHeight;
+  return wrap;
+}
+
+function streamUrl(url) {
+  return `${url.replace(/\/message\/?$/, "")}/message/stream`;
+}
+
+async function readEvents(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let idx;
+    while ((idx = buffer.indexOf("\n\n")) >= 0) {
+      const block = buffer.slice(0, idx);
+      buffer = buffer.slice(idx + 2);
+      let event = "message";
+      const data = [];
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data.push(line.slice(5).trim());
+      });
+      if (data.length) onEvent(event, JSON.parse(data.join("\n")));
+    }
+  }
 }
 
 function renderList(el, items) {
@@ -166,14 +194,14 @@ async function sendMessage() {
   messageInput.value = "";
 
   try {
-    const res = await fetch(apiUrlInput.value.trim(), {
+    const res = await fetch(streamUrl(apiUrlInput.value.trim()), {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify(payload),
     });
-    const data = await res.json();
 
     if (!res.ok) {
+      const data = await res.json();
       const detail = data && data.detail ? String(data.detail) : "Unknown error";
       const hint =
         detail.toLowerCase().includes("api key") ?
@@ -188,13 +216,23 @@ async function sendMessage() {
       return;
     }
 
-    setStatus(true, data.scam_detected ? "Scam Detected" : "Benign");
-    appendBubble("agent", data.agent_reply || "(no reply)");
-    renderList(upiList, data.extracted_intel?.upi_ids);
-    renderList(bankList, data.extracted_intel?.bank_accounts);
-    renderList(linkList, data.extracted_intel?.phishing_links);
-    updateThreatCard(data, payload.message);
-    raw.textContent = JSON.stringify(data, null, 2);
+    // Show the reply as tokens arrive; the full result comes with the "done" event
+    const bubble = appendBubble("agent", "");
+    await readEvents(res, (event, data) => {
+      if (event === "token") {
+        bubble.textContent += data.text;
+        chat.scrollTop = chat.scrollHeight;
+        return;
+      }
+      if (event !== "done") return;
+      setStatus(true, data.scam_detected ? "Scam Detected" : "Benign");
+      bubble.textContent = data.agent_reply || "(no reply)";
+      renderList(upiList, data.extracted_intel?.upi_ids);
+      renderList(bankList, data.extracted_intel?.bank_accounts);
+      renderList(linkList, data.extracted_intel?.phishing_links);
+      updateThreatCard(data, payload.message);
+      raw.textContent = JSON.stringify(data, null, 2);
+    });
   } catch (err) {
     setStatus(false, "Disconnected");
     raw.textContent = String(err);